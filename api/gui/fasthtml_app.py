@@ -1,20 +1,47 @@
+import asyncio
+from urllib.parse import urlencode
+
 from fasthtml.common import (
     H2,
     Card,
     Container,
     Div,
+    EventStream,
     Form,
     Img,
     Input,
     P,
+    Script,
     Style,
     Titled,
     fast_app,
+    sse_message,
+)
+
+from api.utils.compression import CompressionMiddleware
+from api.utils.http import PublicCacheMiddleware, cached_html_response, normalize_query
+from api.utils.logger import setup_logging
+from api.utils.movie import (
+    MAX_SEARCH_LIMIT,
+    fuzzy_search_movies,
+    get_backdrop_image_url,
 )
+from api.utils.resilience import DeadlineMiddleware, UpstreamUnavailableError
+
+setup_logging()
 
-from api.utils.movie import fuzzy_search_movies
+app, rt = fast_app(hdrs=(Script(src="https://unpkg.com/htmx-ext-sse@2.2.1/sse.js"),))
+app.add_middleware(PublicCacheMiddleware)
+# Backdrops fan out to one lookup per result, so their stream gets a larger budget
+app.add_middleware(
+    DeadlineMiddleware, budgets={"/search": 1.5, "/search/backdrops": 3.0}
+)
+# Server-sent events are passed through uncompressed, see `is_compressible`
+app.add_middleware(CompressionMiddleware)
 
-app, rt = fast_app()
+SEARCH_UNAVAILABLE = Div(
+    "Search is temporarily unavailable, please try again.", id="search-results"
+)
 
 
 @rt("/")
@@ -48,7 +75,7 @@ def get():
             type="search",
             name="query",
             placeholder="Search movies...",
-            hx_post="/search",
+            hx_get="/search",
             hx_trigger="keyup changed delay:500ms",
             hx_target="#search-results",
         ),
@@ -60,41 +87,113 @@ def get():
     return Titled("Movie Search", Container(search_form, results_div))
 
 
-@rt("/search")
-def post(query: str = ""):
+def render_backdrop(movie: dict):
+    return Img(
+        src=movie["backdrop_image_url"],
+        cls="movie-backdrop",
+        alt=f"{movie['title']} backdrop",
+    )
+
+
+def render_movie_card(movie: dict, backdrop):
+    return Card(
+        Div(
+            backdrop,
+            Div(
+                H2(movie["title"]),
+                P(f"Release Date: {movie['release_date']}"),
+                P(f"Similarity Score: {movie['similarity']}%"),
+                P(movie["overview"]),
+                cls="movie-details",
+            ),
+            cls="movie-card",
+        )
+    )
+
+
+def render_search_results(query: str, limit: int = 5, stream_backdrops: bool = False):
     if not query:
         return Div("Start typing to search movies...", id="search-results")
 
-    results = fuzzy_search_movies(query=query, include_backdrops=True)
+    results = fuzzy_search_movies(
+        query=query, limit=limit, include_backdrops=not stream_backdrops
+    )
 
     if not results:
         return Div("No movies found", id="search-results")
 
-    movie_items = []
-    for movie in results:
-        backdrop_img = Img(
-            src=movie["backdrop_image_url"],
-            cls="movie-backdrop",
-            alt=f"{movie['title']} backdrop",
+    if not stream_backdrops:
+        movie_items = [
+            render_movie_card(movie, render_backdrop(movie)) for movie in results
+        ]
+        return Div(*movie_items, id="search-results", cls="movie-grid")
+
+    # Send the cards right away, each backdrop is swapped in by its own SSE event
+    # from `/search/backdrops` as soon as it resolves.
+    movie_items = [
+        render_movie_card(
+            movie,
+            Div(
+                Div(aria_busy="true", cls="movie-backdrop"),
+                sse_swap=f"backdrop-{movie['id']}",
+            ),
         )
+        for movie in results
+    ]
+    return Div(
+        *movie_items,
+        id="search-results",
+        cls="movie-grid",
+        hx_ext="sse",
+        sse_connect=f"/search/backdrops?{urlencode({'query': query, 'limit': limit})}",
+        sse_close="done",
+    )
+
 
-        movie_items.append(
-            Card(
-                Div(
-                    backdrop_img,
-                    Div(
-                        H2(movie["title"]),
-                        P(f"Release Date: {movie['release_date']}"),
-                        P(f"Similarity Score: {movie['similarity']}%"),
-                        P(movie["overview"]),
-                        cls="movie-details",
-                    ),
-                    cls="movie-card",
-                )
-            )
+@rt("/search")
+def get(request, query: str = "", limit: int = 5):
+    query = normalize_query(query)
+    limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+    try:
+        results = render_search_results(query, limit, stream_backdrops=True)
+    except UpstreamUnavailableError:
+        return SEARCH_UNAVAILABLE
+    return cached_html_response(request, results)
+
+
+@rt("/search")
+def post(query: str = ""):
+    try:
+        return render_search_results(query)
+    except UpstreamUnavailableError:
+        return SEARCH_UNAVAILABLE
+
+
+async def backdrop_events(query: str, limit: int):
+    try:
+        # Served from the search cache filled by the preceding `/search` request
+        results = await asyncio.to_thread(
+            fuzzy_search_movies, query=query, limit=limit, include_backdrops=False
         )
+    except UpstreamUnavailableError:
+        results = None
+
+    def resolve(movie: dict) -> dict:
+        return {**movie, "backdrop_image_url": get_backdrop_image_url(movie["id"])}
+
+    lookups = [asyncio.to_thread(resolve, movie) for movie in results or []]
+    for lookup in asyncio.as_completed(lookups):
+        movie = await lookup
+        yield sse_message(render_backdrop(movie), event=f"backdrop-{movie['id']}")
+
+    yield sse_message(Div(), event="done")
+
 
-    return Div(*movie_items, id="search-results", cls="movie-grid")
+@rt("/search/backdrops")
+def get(query: str = "", limit: int = 5):
+    query = normalize_query(query)
+    limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+    return EventStream(backdrop_events(query, limit))
 
 
 # if __name__ == "__main__":
@@ -1,5 +1,12 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urlencode
+from uuid import uuid4
+
 from fasthtml.common import (
     H2,
+    H3,
+    A,
     Button,
     Card,
     Container,
@@ -7,23 +14,222 @@ from fasthtml.common import (
     Form,
     Img,
     Input,
+    Li,
+    Link,
     Option,
     P,
     Select,
-    Style,
+    Table,
+    Td,
+    Th,
     Titled,
+    Tr,
+    Ul,
     fast_app,
+    to_xml,
+)
+from starlette.responses import FileResponse, HTMLResponse, Response
+
+from api.utils.admission import (
+    AdaptiveLimit,
+    AdmissionMiddleware,
+    ConcurrencyLimiter,
+    RoutePolicy,
+    is_overloaded,
+)
+from api.utils.analytics import (
+    GAME_FAILED,
+    GAME_SOLVED,
+    GAME_STARTED,
+    GUESS_WRONG,
+    GameAnalytics,
+    GameEvent,
+)
+from api.utils.compression import CompressionMiddleware, PrecompressedStaticMiddleware
+from api.utils.game_pool import GamePool
+from api.utils.http import PublicCacheMiddleware, cached_html_response, normalize_query
+from api.utils.logger import setup_logging
+from api.utils.models import MAX_GUESSES, GameState, MovieRecord
+from api.utils.movie import (
+    IMAGE_TYPES,
+    MAX_SEARCH_LIMIT,
+    MOVIE_CATEGORIES,
+    fuzzy_search_movies,
+    get_random_movie_with_details,
+    tmdb_cache,
 )
+from api.utils.profiling import (
+    PROFILE_HEADER,
+    ProfileStore,
+    ProfilingConfig,
+    ProfilingMiddleware,
+    verify_profile_token,
+)
+from api.utils.resilience import DeadlineMiddleware, UpstreamUnavailableError
+from api.utils.snapshot import SnapshotManager
+from api.utils.store import get_redis
+
+setup_logging()
+
+
+def load_game_movie(key: tuple[str, str]) -> MovieRecord:
+    category, mode = key
+    return get_random_movie_with_details(category=category, image_type=mode)
 
-from api.utils.movie import fuzzy_search_movies, get_random_movie_with_details
 
-app, rt = fast_app(secret_key="your-secret-key-here")  # Add secret key for session
+# Prepared movies per (category, mode), so new games skip the TMDB round trips
+game_pool = GamePool(load_game_movie)
 
+# Caches and game pools survive restarts through periodic on-disk snapshots
+snapshots = SnapshotManager.from_env({"tmdb_cache": tmdb_cache, "game_pool": game_pool})
+
+# Game events are buffered in-process and written to Redis in the background
+analytics = GameAnalytics.from_env(get_redis())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    snapshots.start()
+    analytics.start()
+    try:
+        yield
+    finally:
+        # The snapshot is written even if flushing analytics fails
+        try:
+            analytics.stop()
+        finally:
+            snapshots.stop()
+
+
+app, rt = fast_app(
+    secret_key="your-secret-key-here",  # Add secret key for session
+    lifespan=lifespan,
+    hdrs=(Link(rel="stylesheet", href="/css/game.css"),),
+)
+app.add_middleware(PublicCacheMiddleware)
+
+profiling_config = ProfilingConfig.from_env()
+profile_store = ProfileStore(profiling_config.directory, profiling_config.max_profiles)
+app.add_middleware(ProfilingMiddleware, config=profiling_config, store=profile_store)
+
+# Latency budgets (seconds) shared by all TMDB calls made while serving a route
+ROUTE_BUDGETS = {"/": 4.0, "/new-game": 4.0, "/search": 1.5, "/guess": 1.5}
+
+# Concurrency limits of the routes calling TMDB, adapted to their latency. They
+# stay below the threadpool size (40), so cheap renders always find a thread.
+# Requests over the limit wait briefly, guesses ahead of searches, and then get
+# a fallback: a busy message, or a game from the pool instead of a TMDB call.
+admission_limiters = {
+    "search": ConcurrencyLimiter(AdaptiveLimit(initial=8, max_limit=16)),
+    "game": ConcurrencyLimiter(AdaptiveLimit(initial=4, max_limit=12), max_queue=16),
+}
+GUESS_BUSY = HTMLResponse(
+    to_xml(Div("Too many guesses right now, please try again.", id="search-results"))
+)
+ADMISSION_ROUTES = {
+    "/guess": RoutePolicy("search", priority=0, max_wait=1.0, fallback=GUESS_BUSY),
+    "/search": RoutePolicy("search", priority=1, max_wait=0.1),
+    "/new-game": RoutePolicy("game", max_wait=0.5),
+    "/": RoutePolicy("game", max_wait=0.5),
+}
+# `DeadlineMiddleware` wraps this one, so time spent waiting counts against budgets
+app.add_middleware(
+    AdmissionMiddleware, limiters=admission_limiters, routes=ADMISSION_ROUTES
+)
+app.add_middleware(DeadlineMiddleware, budgets=ROUTE_BUDGETS)
 
-@rt("/")
-def get(session):
-    # Get current category from session, default to 'popular'
-    current_category = session.get("game", {}).get("category", "popular")
+# Static assets, with variants precompressed at build time (`make precompress-static`)
+PUBLIC_DIR = Path(__file__).resolve().parents[2] / "public"
+app.add_middleware(PrecompressedStaticMiddleware, directory=PUBLIC_DIR)
+# Outermost, so every dynamic response is compressed once it is final
+app.add_middleware(CompressionMiddleware)
+
+
+# TMDB image size per game mode
+IMAGE_SIZES = {"backdrops": "w1280", "posters": "w780"}
+
+
+def render_game_image(path: str, mode: str = "backdrops", **kwargs):
+    return Div(
+        Img(
+            src=f"https://image.tmdb.org/t/p/{IMAGE_SIZES[mode]}{path}",
+            cls=f"backdrop-img {mode}-img",
+        ),
+        cls="backdrop-container",
+        id="backdrop-container",
+        **kwargs,
+    )
+
+
+def render_guess_counter(guesses_remaining: int, **kwargs):
+    return Div(
+        P(
+            f"Guesses remaining: {guesses_remaining}",
+            style="margin-bottom: 0.5rem;",
+        ),
+        Div(
+            *[
+                Div(
+                    cls=f"guess-indicator {'guess-used' if i >= guesses_remaining else ''}"
+                )
+                for i in range(MAX_GUESSES)
+            ],
+            style="text-align: center;",
+        ),
+        cls="guess-counter",
+        id="guess-counter",
+        **kwargs,
+    )
+
+
+def render_unavailable():
+    return Titled(
+        "Movie Guess Game",
+        Container(
+            P("Movies are temporarily unavailable, please try again shortly."),
+            Button("Try Again", hx_post="/new-game", hx_target="body"),
+        ),
+    )
+
+
+def player_id(session) -> str:
+    # Anonymous id used to rank players on the leaderboard
+    if "player" not in session:
+        session["player"] = uuid4().hex[:8]
+    return session["player"]
+
+
+def start_game(
+    session, category: str = "popular", mode: str = "backdrops", ready_only=False
+):
+    # Get new movie from selected category, with enough images for the mode.
+    # With `ready_only` only an already prepared movie is used, never TMDB.
+    if ready_only:
+        movie = game_pool.take_ready((category, mode))
+        if movie is None:
+            raise UpstreamUnavailableError("new game: no prepared movie")
+    else:
+        movie = game_pool.take((category, mode))
+    game = GameState.new(movie, category, mode)
+    session["game"] = game.to_session()
+    analytics.record(
+        GameEvent(GAME_STARTED, player_id(session), movie.id, title=movie.title)
+    )
+    return game
+
+
+@rt("/", methods=["get"])
+def index(request, session):
+    # Initialize new game if there is no (current) game in the session
+    game = GameState.from_session(session.get("game"))
+    if game is None:
+        try:
+            game = start_game(session, ready_only=is_overloaded(request))
+        except UpstreamUnavailableError:
+            return render_unavailable()
+
+    current_category = game.category
+    current_mode = game.mode
 
     # Add top navigation with category selector and new game button
     top_nav = Div(
@@ -54,85 +260,42 @@ def get(session):
                 hx_target="body",
                 hx_trigger="change",
             ),
+            Select(
+                Option(
+                    "Guess from Backdrops",
+                    value="backdrops",
+                    selected=current_mode == "backdrops",
+                ),
+                Option(
+                    "Guess from Posters",
+                    value="posters",
+                    selected=current_mode == "posters",
+                ),
+                name="mode",
+                hx_post="/new-game",
+                hx_target="body",
+                hx_trigger="change",
+            ),
+            id="game-options",
             style="display: inline-block; margin-right: 1rem;",
         ),
-        Button("New Game", hx_post="/new-game", hx_target="body"),
+        Button(
+            "New Game",
+            hx_post="/new-game",
+            hx_include="#game-options",
+            hx_target="body",
+        ),
+        A("Leaderboard", href="/leaderboard", style="margin-left: 1rem;"),
         style="text-align: right; margin-bottom: 1rem;",
     )
 
     search_box = Form(
-        Style("""
-            .backdrop-container {
-                width: 100%;
-                max-width: 800px;
-                margin: 0 auto;
-            }
-            .backdrop-img {
-                width: 100%;
-                aspect-ratio: 16/9;
-                object-fit: cover;
-                border-radius: 8px;
-            }
-            /* Add title styling */
-            h1 {
-                text-align: center;
-                margin: 2rem 0;
-            }
-            /* Rest of existing styles */
-            .search-results {
-                margin-top: 1rem;
-            }
-            .correct-guess {
-                color: green;
-                font-weight: bold;
-            }
-            .wrong-guess {
-                color: red;
-            }
-            .search-item {
-                cursor: pointer;
-                padding: 0.5rem;
-                margin: 0.25rem 0;
-                border-radius: 4px;
-            }
-            .search-item:hover {
-                background-color: #f0f0f0;
-            }
-            .guess-counter {
-                text-align: center;
-                margin: 1rem 0;
-                font-size: 1.2rem;
-            }
-            .guess-indicator {
-                display: inline-block;
-                width: 20px;
-                height: 20px;
-                margin: 0 5px;
-                border-radius: 50%;
-                background-color: #ddd;
-            }
-            .guess-used {
-                background-color: #666;
-            }
-            .search-form {
-                display: flex;
-                gap: 1rem;
-                align-items: center;
-            }
-            .search-form input[type="search"] {
-                flex: 1;
-                margin: 0;
-            }
-            .search-form button {
-                margin: 0;
-            }
-        """),
         Div(
             Input(
                 type="search",
                 name="query",
                 placeholder="Guess the movie...",
-                hx_post="/search",
+                hx_get="/search",
                 hx_trigger="input changed delay:200ms",
                 hx_target="#search-results",
                 autocomplete="off",  # To prevent browser autocomplete from interfering
@@ -148,48 +311,12 @@ def get(session):
         id="search-form",
     )
 
-    # Initialize new game if not exists in session
-    if "game" not in session:
-        movie = get_random_movie_with_details()
-        current_backdrop = movie["backdrops"][0] if movie["backdrops"] else None
-        session["game"] = {
-            "movie": movie,
-            "current_backdrop_index": 0,
-            "shown_backdrops": [current_backdrop] if current_backdrop else [],
-            "guesses_remaining": 5,
-        }
-
-    current_game = session["game"]  # Get game state from session
-
     backdrop = None
-    if current_game["shown_backdrops"]:
-        backdrop_url = (
-            f"https://image.tmdb.org/t/p/w1280{current_game['shown_backdrops'][0]}"
-        )
-        backdrop = Div(
-            Img(src=backdrop_url, cls="backdrop-img"),
-            cls="backdrop-container",
-            id="backdrop-container",  # Add this ID
-        )
+    if game.image_path is not None:
+        backdrop = render_game_image(game.image_path, game.mode)
 
     # Add guess counter display
-    guess_indicators = Div(
-        P(
-            f"Guesses remaining: {current_game.get('guesses_remaining', 5)}",
-            style="margin-bottom: 0.5rem;",
-        ),
-        Div(
-            *[
-                Div(
-                    cls=f"guess-indicator {'guess-used' if i >= current_game.get('guesses_remaining', 5) else ''}"
-                )
-                for i in range(5)
-            ],
-            style="text-align: center;",
-        ),
-        cls="guess-counter",
-        id="guess-counter",
-    )
+    guess_indicators = render_guess_counter(game.guesses_remaining)
 
     results_div = Div(id="search-results")
 
@@ -201,14 +328,19 @@ def get(session):
     )
 
 
-@rt("/search")
-def post(query: str = ""):
+SEARCH_UNAVAILABLE = Div(
+    "Search is temporarily unavailable, please try again.", id="search-results"
+)
+SEARCH_BUSY = Div("Search is busy, keep typing...", id="search-results")
+
+
+def render_search_results(query: str, limit: int = 3):
     MIN_CHARS = 2
 
     if not query or len(query) < MIN_CHARS:
         return Div("Start typing to search for movies...", id="search-results")
 
-    results = fuzzy_search_movies(query=query, limit=3, include_backdrops=False)
+    results = fuzzy_search_movies(query=query, limit=limit, include_backdrops=False)
     if not results:
         return Div("No movies found", id="search-results")
 
@@ -222,50 +354,74 @@ def post(query: str = ""):
             """.format(movie["title"].replace('"', '\\"')),
             cls="search-item",
         )
-        for movie in results[:3]
+        for movie in results[:limit]
     ]
 
     return Div(*movie_items, id="search-results", cls="search-results")
 
 
+@rt("/search")
+def get(request, query: str = "", limit: int = 3):
+    # Results only depend on the normalized query and limit, so every player can
+    # share the same cached response from the browser, edge or reverse proxy.
+    query = normalize_query(query)
+    limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+    if is_overloaded(request):
+        return SEARCH_BUSY
+    try:
+        results = render_search_results(query, limit)
+    except UpstreamUnavailableError:
+        # Not cacheable, the next keystroke should try TMDB again
+        return SEARCH_UNAVAILABLE
+    return cached_html_response(request, results)
+
+
+@rt("/search")
+def post(request, query: str = ""):
+    if is_overloaded(request):
+        return SEARCH_BUSY
+    try:
+        return render_search_results(query)
+    except UpstreamUnavailableError:
+        return SEARCH_UNAVAILABLE
+
+
 @rt("/guess")
 def post(query: str = "", session=None):  # Add session parameter
-    if not query:
+    game = GameState.from_session(session.get("game"))
+    if not query or game is None:
         return Div("Please select a movie to guess", id="search-results")
 
-    results = fuzzy_search_movies(query=query, limit=3, include_backdrops=False)
+    try:
+        results = fuzzy_search_movies(query=query, limit=3, include_backdrops=False)
+    except UpstreamUnavailableError:
+        return SEARCH_UNAVAILABLE
     if not results:
         return Div("No movies found", id="search-results")
 
-    current_game = session["game"]  # Get game state from session
-    current_movie = current_game["movie"]
+    current_movie = game.movie
     movie = results[0]  # Use the best match
-    is_correct = movie["id"] == current_movie["id"]
+    is_correct = movie["id"] == current_movie.id
 
     # Decrease remaining guesses
-    current_game["guesses_remaining"] = current_game.get("guesses_remaining", 5) - 1
-    session["game"] = current_game  # Save updated game state back to session
+    game.guesses_remaining -= 1
+    next_image = None if is_correct else game.next_image()
 
-    # Update guess counter display
-    updated_counter = Div(
-        P(
-            f"Guesses remaining: {current_game['guesses_remaining']}",
-            style="margin-bottom: 0.5rem;",
-        ),
-        Div(
-            *[
-                Div(
-                    cls=f"guess-indicator {'guess-used' if i >= current_game['guesses_remaining'] else ''}"
-                )
-                for i in range(5)
-            ],
-            style="text-align: center;",
-        ),
-        cls="guess-counter",
-        id="guess-counter",
-        hx_swap_oob="true",
+    if is_correct or next_image is None:
+        # Finished games are not kept, so they can't be guessed (and counted) again
+        del session["game"]
+        kind = GAME_SOLVED if is_correct else GAME_FAILED
+    else:
+        session["game"] = game.to_session()  # Save updated game state back to session
+        kind = GUESS_WRONG
+    guesses_used = MAX_GUESSES - game.guesses_remaining
+    analytics.record(
+        GameEvent(kind, player_id(session), current_movie.id, guesses_used)
     )
 
+    # Update guess counter display
+    updated_counter = render_guess_counter(game.guesses_remaining, hx_swap_oob="true")
+
     if is_correct:
         return (
             Card(
@@ -279,51 +435,23 @@ def post(query: str = "", session=None):  # Add session parameter
             updated_counter,
         )
 
-    # Check if out of guesses
-    if current_game["guesses_remaining"] <= 0:
-        return Card(
-            Div(
-                H2("Game Over!", cls="wrong-guess"),
-                P(f"The correct movie was: {current_movie['title']}"),
-                P(current_movie["overview"]),
-                Button("Play Again", hx_post="/new-game", hx_target="body"),
-            )
-        )
-
-    # Show next backdrop if wrong guess and still have guesses
-    if (
-        len(current_game["movie"]["backdrops"])
-        > current_game["current_backdrop_index"] + 1
-    ):
-        # Increment the index and get the next backdrop
-        current_game["current_backdrop_index"] += 1
-        next_backdrop = current_game["movie"]["backdrops"][
-            current_game["current_backdrop_index"]
-        ]
-        # Replace the current backdrop with the new one
-        current_game["shown_backdrops"] = [next_backdrop]
-        session["game"] = current_game  # Save updated game state back to session
-        backdrop_url = f"https://image.tmdb.org/t/p/w1280{next_backdrop}"
+    # Show next image if wrong guess and still have guesses, otherwise game over
+    if next_image is not None:
         return (
             Div(
                 P(f"Wrong guess: {movie['title']}", cls="wrong-guess"),
                 id="search-results",
             ),
             # Add id to match the container we want to replace
-            Div(
-                Img(src=backdrop_url, cls="backdrop-img"),
-                cls="backdrop-container",
-                id="backdrop-container",
-                hx_swap_oob="true",
-            ),
+            render_game_image(next_image, game.mode, hx_swap_oob="true"),
             updated_counter,
         )
     return (
         Card(
             Div(
                 H2("Game Over!", cls="wrong-guess"),
-                P(f"The correct movie was: {current_movie['title']}"),
-                P(current_movie["overview"]),
+                P(f"The correct movie was: {current_movie.title}"),
+                P(current_movie.overview),
                 Button("Play Again", hx_post="/new-game", hx_target="body"),
             )
         ),
@@ -332,23 +460,79 @@ def post(query: str = "", session=None):  # Add session parameter
 
 
 @rt("/new-game")
-def post(category: str = "popular", session=None):
+def post(request, category: str = "popular", mode: str = "backdrops", session=None):
     if "game" in session:
         del session["game"]
+    if mode not in IMAGE_TYPES:
+        mode = "backdrops"
+    if category not in MOVIE_CATEGORIES:
+        category = "popular"
+
+    try:
+        start_game(session, category, mode, ready_only=is_overloaded(request))
+    except UpstreamUnavailableError:
+        return render_unavailable()
+
+    return index(request, session)
+
+
+@rt("/leaderboard")
+def get():
+    # Served from the aggregates precomputed by the analytics flusher, no I/O
+    board = analytics.leaderboard
+    players = [
+        Tr(Td(rank), Td(f"Player {player}"), Td(score))
+        for rank, (player, score) in enumerate(board.players, start=1)
+    ]
+    movies = [
+        Tr(Td(stats.title), Td(stats.played), Td(f"{stats.solve_rate:.0%}"))
+        for stats in board.movies
+    ]
+    distribution = [
+        Li(f"{guesses} guess{'es' if guesses > 1 else ''}: {count}")
+        for guesses, count in board.guesses_to_solve.items()
+    ]
+    return Titled(
+        "Leaderboard",
+        Container(
+            P(f"{board.solved} of {board.games} games solved"),
+            Table(Tr(Th("#"), Th("Player"), Th("Score")), *players),
+            H3("Most played movies"),
+            Table(Tr(Th("Movie"), Th("Games"), Th("Solved")), *movies),
+            H3("Guesses to solve"),
+            Ul(*distribution),
+            A("Back to the game", href="/"),
+        ),
+    )
+
+
+def profiling_admin_token(request, token: str = "") -> str | None:
+    """The valid admin token from the query or the `X-Profile` header, if any."""
+    token = token or request.headers.get(PROFILE_HEADER, "")
+    return token if verify_profile_token(profiling_config.secret, token) else None
 
-    # Get new movie from selected category
-    movie = get_random_movie_with_details(category=category)
-    current_backdrop = movie["backdrops"][0] if movie["backdrops"] else None
 
-    session["game"] = {
-        "movie": movie,
-        "current_backdrop_index": 0,
-        "shown_backdrops": [current_backdrop] if current_backdrop else [],
-        "guesses_remaining": 5,
-        "category": category,  # Store selected category
-    }
+@rt("/admin/profiles")
+def get(request, token: str = ""):
+    token = profiling_admin_token(request, token)
+    if token is None:
+        return Response(status_code=404)
+
+    # Links carry the token, header based logins included, as browsers can't add it
+    query = urlencode({"token": token})
+    profiles = [
+        Li(A(name, href=f"/admin/profiles/{name}?{query}"))
+        for name in profile_store.names()
+    ]
+    return Titled("Profiles", Ul(*profiles) if profiles else P("No profiles yet"))
+
 
-    return get(session)
+@rt("/admin/profiles/{name}")
+def get(request, name: str, token: str = ""):
+    path = profile_store.path(name)
+    if profiling_admin_token(request, token) is None or path is None:
+        return Response(status_code=404)
+    return FileResponse(path, media_type="text/plain", filename=name)
 
 
 # FIXME: Doesn't work since it can't find the `api` module
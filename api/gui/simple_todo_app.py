@@ -1,7 +1,5 @@
-import os
 from dataclasses import dataclass
 
-import redis
 from fasthtml.common import (
     AX,
     Button,
@@ -20,9 +18,15 @@ from fasthtml.common import (
     fill_form,
     patch,
 )
-from tinyredis import TinyRedis
+
+from api.utils.compression import CompressionMiddleware
+from api.utils.logger import setup_logging
+from api.utils.store import CachedTinyRedis, get_redis
+
+setup_logging()
 
 app, rt = fast_app()
+app.add_middleware(CompressionMiddleware)
 
 
 @dataclass
@@ -33,7 +37,8 @@ class Todo:
     priority: int = 0
 
 
-todos = TinyRedis(redis.from_url(os.environ["VERCEL_KV_REDIS_URL"]), Todo)
+# Sorted todos are cached in-process and only reloaded when the version changes
+todos = CachedTinyRedis(get_redis(), Todo, sort_key=lambda o: o.priority)
 
 
 def tid(id):
@@ -68,7 +73,7 @@ async def get():
         target_id="todo-list",
         hx_swap="beforeend",
     )
-    items = sorted(todos(), key=lambda o: o.priority)
+    items = todos()
     frm = Form(
         *items, id="todo-list", cls="sortable", hx_post="/reorder", hx_trigger="end"
     )
@@ -79,9 +84,11 @@ async def get():
 def post(id: list[str]):
     items = todos()
     pos = {u: i for i, u in enumerate(id)}
-    for o in items:
+    # Only rewrite moved todos, all of them in a single pipeline
+    moved = [o for o in items if o.priority != pos[o.id]]
+    for o in moved:
         o.priority = pos[o.id]
-    todos.insert_all(items)
+    todos.insert_all(moved)
     return tuple(sorted(items, key=lambda o: o.priority))
 
 
@@ -0,0 +1,242 @@
+"""Adaptive per route concurrency limits with prioritized, bounded wait queues."""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass
+
+from loguru import logger
+from starlette.responses import Response
+
+# `scope["state"]` flag set on requests admitted past their limit in degraded mode
+OVERLOADED = "overloaded"
+
+
+class AdaptiveLimit:
+    """Concurrency limit following latency with a gradient (AIMD-like) update.
+
+    Each completed request compares its latency to a slowly moving average. While
+    latency stays within `tolerance` of that average the limit grows by about
+    `sqrt(limit)` per update. Once latency rises above it, the limit is pulled
+    down in proportion to the increase. Failed requests halve the limit. The limit only
+    grows while it is actually used, so an idle route doesn't inflate it.
+
+    Examples:
+        >>> limit = AdaptiveLimit(initial=10, max_limit=20)
+        >>> for _ in range(50):
+        ...     limit.update(latency=0.1, inflight=10)
+        >>> limit.limit
+        20.0
+        >>> for _ in range(20):
+        ...     limit.update(latency=1.0, inflight=20)
+        >>> limit.limit < 10
+        True
+
+    Args:
+        initial: Starting limit.
+        min_limit: Lower bound of the limit.
+        max_limit: Upper bound of the limit.
+        tolerance: Latency increase over the average treated as normal.
+    """
+
+    # Weight of each update, between 0 and 1
+    smoothing = 0.2
+    # Number of samples the average latency roughly spans
+    window = 100
+
+    def __init__(
+        self,
+        initial: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 32,
+        tolerance: float = 1.5,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.average_latency: float | None = None
+
+    def update(self, latency: float, inflight: int, failed: bool = False) -> None:
+        if failed:
+            self.limit = max(float(self.min_limit), self.limit / 2)
+            return
+
+        latency = max(latency, 1e-6)
+        if self.average_latency is None:
+            self.average_latency = latency
+        self.average_latency += (latency - self.average_latency) / self.window
+
+        gradient = self.tolerance * self.average_latency / latency
+        gradient = min(1.0, max(0.5, gradient))
+        if gradient == 1.0 and inflight < self.limit / 2:
+            return
+
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit + (target - self.limit) * self.smoothing
+        self.limit = float(min(self.max_limit, max(self.min_limit, limit)))
+
+
+class ConcurrencyLimiter:
+    """Admit up to `limit` concurrent requests, queueing the rest by priority.
+
+    The queue holds at most `max_queue` waiters. When it is full, a request with
+    a better (lower) priority takes the place of the worst waiter, which is
+    rejected immediately instead of timing out later. Meant to be used from a
+    single event loop, like ASGI middlewares are.
+    """
+
+    def __init__(self, limit: AdaptiveLimit | None = None, max_queue: int = 32):
+        self.limit = limit or AdaptiveLimit()
+        self.max_queue = max_queue
+        self.inflight = 0
+        self.rejected = 0
+        # (priority, arrival, future), the future is resolved with True on admission
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit.limit))
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self) -> bool:
+        self.rejected += 1
+        return False
+
+    def _forget(self, entry: tuple[int, int, asyncio.Future]) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _free_slot(self) -> None:
+        self.inflight -= 1
+        self._admit_waiters()
+
+    def _admit_waiters(self) -> None:
+        """Hand free slots to the best waiters, as many as the limit allows."""
+        while self._waiters and self.inflight < self.capacity:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.inflight += 1
+                future.set_result(True)
+
+    async def acquire(self, priority: int = 0, max_wait: float = 0.0) -> bool:
+        """Wait up to `max_wait` seconds for a slot.
+
+        Returns:
+            Whether the request was admitted, in which case `release` must follow.
+        """
+        # The limit may have grown since the waiters were queued
+        self._admit_waiters()
+        if self.inflight < self.capacity and not self._waiters:
+            self.inflight += 1
+            return True
+        if max_wait <= 0:
+            return self._reject()
+
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                return self._reject()
+            self._forget(worst)
+            # Its task may have been cancelled already
+            if not worst[2].done():
+                worst[2].set_result(False)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._arrivals), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            async with asyncio.timeout(max_wait):
+                admitted = await future
+        except TimeoutError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the timeout fired
+                return future.result()
+            self._forget(entry)
+            return self._reject()
+        except asyncio.CancelledError:
+            self._forget(entry)
+            if future.done() and not future.cancelled() and future.result():
+                # The slot was handed over before the cancellation arrived
+                self._free_slot()
+            raise
+        return admitted or self._reject()
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        """Free a slot, handing free slots to the best waiters."""
+        self.limit.update(latency, self.inflight, failed)
+        self._free_slot()
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    """How a route is admitted.
+
+    Attributes:
+        limiter: Name of the `ConcurrencyLimiter` shared by the route.
+        priority: Lower priorities are admitted first from the wait queue.
+        max_wait: Seconds a request may wait for a slot.
+        fallback: Response sent to requests that didn't get a slot. When None
+            they are handled anyway, with `OVERLOADED` set in `scope["state"]`,
+            so the handler can serve a cheap fallback of its own.
+    """
+
+    limiter: str
+    priority: int = 0
+    max_wait: float = 0.5
+    fallback: Response | None = None
+
+
+def is_overloaded(request) -> bool:
+    """Whether the request was admitted past its limit and should degrade."""
+    return request.scope.get("state", {}).get(OVERLOADED, False)
+
+
+class AdmissionMiddleware:
+    """Limit concurrent requests per route with adaptive `ConcurrencyLimiter`s.
+
+    Routes without a policy are not limited. Keep the sum of the limiters'
+    `max_limit` below the threadpool size, so fallbacks and unlimited routes
+    always find a free thread.
+    """
+
+    def __init__(
+        self,
+        app,
+        limiters: dict[str, ConcurrencyLimiter],
+        routes: dict[str, RoutePolicy],
+    ):
+        self.app = app
+        self.limiters = limiters
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        policy = self.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[policy.limiter]
+        if not await limiter.acquire(policy.priority, policy.max_wait):
+            logger.debug("Shedding {} ({} queued)", scope["path"], limiter.queued)
+            if policy.fallback is not None:
+                await policy.fallback(scope, receive, send)
+                return
+            state = {**scope.get("state", {}), OVERLOADED: True}
+            await self.app({**scope, "state": state}, receive, send)
+            return
+
+        start = time.monotonic()
+        failed = True
+        try:
+            await self.app(scope, receive, send)
+            failed = False
+        finally:
+            limiter.release(time.monotonic() - start, failed)
@@ -0,0 +1,270 @@
+"""Write-behind game analytics: a ring buffer flushed to Redis in batches."""
+
+import os
+import threading
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from api.utils.models import MAX_GUESSES
+
+# Event kinds, a game is started, then gets wrong guesses until solved or failed
+GAME_STARTED = "started"
+GUESS_WRONG = "wrong"
+GAME_SOLVED = "solved"
+GAME_FAILED = "failed"
+
+
+@dataclass(frozen=True, slots=True)
+class GameEvent:
+    """Something that happened in a game, recorded by the route handlers."""
+
+    kind: str
+    player: str
+    movie_id: int
+    guesses_used: int = 0
+    title: str | None = None
+
+
+def _solved_in(fields: dict[bytes, bytes]) -> dict[int, int]:
+    prefix = b"solved_in:"
+    return dict(
+        sorted(
+            (int(name.removeprefix(prefix)), int(value))
+            for name, value in fields.items()
+            if name.startswith(prefix)
+        )
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class MovieStats:
+    """Aggregated results of the games played with a movie."""
+
+    movie_id: int
+    title: str
+    played: int = 0
+    solved: int = 0
+    failed: int = 0
+    guesses_to_solve: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def solve_rate(self) -> float:
+        return self.solved / self.played if self.played else 0.0
+
+    @classmethod
+    def from_hash(cls, movie_id: int, fields: dict[bytes, bytes]) -> "MovieStats":
+        return cls(
+            movie_id=movie_id,
+            title=fields.get(b"title", b"").decode() or str(movie_id),
+            played=int(fields.get(b"played", 0)),
+            solved=int(fields.get(b"solved", 0)),
+            failed=int(fields.get(b"failed", 0)),
+            guesses_to_solve=_solved_in(fields),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Leaderboard:
+    """Precomputed aggregates served by the leaderboard page."""
+
+    players: list[tuple[str, int]] = field(default_factory=list)
+    movies: list[MovieStats] = field(default_factory=list)
+    games: int = 0
+    solved: int = 0
+    guesses_to_solve: dict[int, int] = field(default_factory=dict)
+
+
+class GameAnalytics:
+    """Collect game events without touching the store on the request path.
+
+    `record` appends to a bounded in-process ring buffer, which drops the oldest
+    events when full rather than slowing down gameplay. A background thread
+    aggregates the buffer into counters and histograms every `interval` seconds
+    and writes them to a Redis-compatible store in one transaction. Aggregates of
+    a failed write are retried on the next flush. If the connection drops after
+    the transaction was committed, the retry counts those events twice. Each
+    flush then reloads the leaderboard, which route handlers read from memory.
+
+    Examples:
+        >>> from api.utils.store import LocalRedis
+        >>> analytics = GameAnalytics(LocalRedis())
+        >>> analytics.record(GameEvent(GAME_STARTED, "p1", 603, title="The Matrix"))
+        >>> analytics.record(GameEvent(GAME_SOLVED, "p1", 603, guesses_used=2))
+        >>> analytics.flush()
+        2
+        >>> analytics.leaderboard.players
+        [('p1', 4)]
+
+    Args:
+        redis: Redis client, or `LocalRedis`.
+        capacity: Events buffered between flushes before the oldest are dropped.
+        interval: Seconds between flushes, 0 disables the background thread.
+        prefix: Prefix of every key written.
+        top_n: Players and movies kept in the leaderboard.
+    """
+
+    def __init__(
+        self,
+        redis,
+        capacity: int = 10_000,
+        interval: float = 5.0,
+        prefix: str = "analytics",
+        top_n: int = 10,
+    ):
+        self.redis = redis
+        self.interval = interval
+        self.prefix = prefix
+        self.top_n = top_n
+        self.dropped = 0
+        self.leaderboard = Leaderboard()
+        self._buffer: deque[GameEvent] = deque(maxlen=capacity)
+        # Aggregates not written yet, kept across failed flushes
+        self._counts: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self._scores: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self._titles: dict[str, str] = {}
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def from_env(cls, redis) -> "GameAnalytics":
+        return cls(
+            redis,
+            capacity=int(os.getenv("ANALYTICS_BUFFER_SIZE", "10000")),
+            interval=float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5")),
+        )
+
+    def key(self, *parts) -> str:
+        return ":".join([self.prefix, *map(str, parts)])
+
+    def record(self, event: GameEvent) -> None:
+        """Buffer an event, this never blocks or does I/O."""
+        # deque appends are thread safe, the drop counter is only approximate
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(event)
+        if len(self._buffer) >= self._buffer.maxlen // 2:
+            self._wake.set()
+
+    def _aggregate(self, event: GameEvent) -> None:
+        totals = self._counts[self.key("totals")]
+        movie = self.key("movie", event.movie_id)
+        if event.kind == GAME_STARTED:
+            totals["games"] += 1
+            self._counts[movie]["played"] += 1
+            self._scores[self.key("movies")][str(event.movie_id)] += 1
+            if event.title:
+                self._titles[movie] = event.title
+            return
+
+        # Every other event is a guess
+        fields = ["guesses"]
+        if event.kind == GAME_SOLVED:
+            fields += ["solved", f"solved_in:{event.guesses_used}"]
+            points = MAX_GUESSES - event.guesses_used + 1
+            self._scores[self.key("players")][event.player] += points
+        elif event.kind == GAME_FAILED:
+            fields.append("failed")
+        for name in fields:
+            totals[name] += 1
+            self._counts[movie][name] += 1
+
+    def flush(self) -> int:
+        """Write buffered events as aggregates and refresh the leaderboard.
+
+        Returns:
+            The number of events taken from the buffer.
+        """
+        with self._flush_lock:
+            events = 0
+            while self._buffer:
+                self._aggregate(self._buffer.popleft())
+                events += 1
+
+            if self._counts or self._scores or self._titles:
+                # MULTI/EXEC, a failed write is never partly applied and then
+                # retried. Only a connection lost after EXEC can still count twice.
+                pipe = self.redis.pipeline(transaction=True)
+                for key, counts in self._counts.items():
+                    for name, amount in counts.items():
+                        pipe.hincrby(key, name, amount)
+                for key, scores in self._scores.items():
+                    for member, amount in scores.items():
+                        pipe.zincrby(key, amount, member)
+                for key, title in self._titles.items():
+                    pipe.hset(key, "title", title)
+                pipe.execute()
+                self._counts.clear()
+                self._scores.clear()
+                self._titles.clear()
+
+            self.refresh()
+            return events
+
+    def refresh(self) -> None:
+        """Reload the leaderboard from the store, two round trips."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrevrange(self.key("players"), 0, self.top_n - 1, withscores=True)
+        pipe.zrevrange(self.key("movies"), 0, self.top_n - 1)
+        pipe.hgetall(self.key("totals"))
+        players, movie_ids, totals = pipe.execute()
+
+        movie_ids = [int(movie_id) for movie_id in movie_ids]
+        pipe = self.redis.pipeline(transaction=False)
+        for movie_id in movie_ids:
+            pipe.hgetall(self.key("movie", movie_id))
+        movies = pipe.execute()
+
+        self.leaderboard = Leaderboard(
+            players=[(player.decode(), int(score)) for player, score in players],
+            movies=[
+                MovieStats.from_hash(movie_id, fields)
+                for movie_id, fields in zip(movie_ids, movies, strict=True)
+            ],
+            games=int(totals.get(b"games", 0)),
+            solved=int(totals.get(b"solved", 0)),
+            guesses_to_solve=_solved_in(totals),
+        )
+
+    def movie_stats(self, movie_id: int) -> MovieStats:
+        return MovieStats.from_hash(
+            movie_id, self.redis.hgetall(self.key("movie", movie_id))
+        )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Flushing analytics failed: {}", e)
+
+    def start(self) -> None:
+        """Load the leaderboard and start flushing in the background."""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("Loading leaderboard failed: {}", e)
+
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="analytics", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and flush what is left, never raising."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Final analytics flush failed, events are lost: {}", e)
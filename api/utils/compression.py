@@ -0,0 +1,304 @@
+"""Response compression and precompressed static files, negotiated per request.
+
+Brotli is used when the optional `brotli` package is installed, gzip otherwise.
+Static assets are compressed once at build time with:
+
+    python -m api.utils.compression public
+"""
+
+import argparse
+import gzip
+import mimetypes
+import zlib
+from pathlib import Path
+
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+# Supported encodings, most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+# File suffix of the precompressed variant per encoding
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Bodies smaller than this (bytes) gain little and are sent as is
+MINIMUM_SIZE = 500
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "image/vnd.microsoft.icon",
+    "image/x-icon",
+)
+# Streams whose every message must reach the client right away
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def is_compressible(content_type: str | None) -> bool:
+    """Whether a response of `content_type` is worth compressing.
+
+    Examples:
+        >>> is_compressible("text/html; charset=utf-8")
+        True
+        >>> is_compressible("text/event-stream")
+        False
+        >>> is_compressible("image/png")
+        False
+    """
+    if not content_type:
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(
+        UNCOMPRESSED_TYPES
+    )
+
+
+def negotiate_encoding(
+    accept_encoding: str, available: tuple[str, ...] = ENCODINGS
+) -> str | None:
+    """Pick the encoding of `available` the client prefers, by `q` value then order.
+
+    Examples:
+        >>> negotiate_encoding("gzip, deflate, br", ("br", "gzip"))
+        'br'
+        >>> negotiate_encoding("br;q=0, *;q=0.5", ("br", "gzip"))
+        'gzip'
+        >>> negotiate_encoding("identity", ("br", "gzip")) is None
+        True
+    """
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+
+    default = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, default)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class StreamCompressor:
+    """Incremental gzip or brotli compressor.
+
+    Chunks are flushed as they are compressed, so streamed responses reach the
+    client piece by piece instead of when the compressor's buffer fills up.
+    """
+
+    def __init__(self, encoding: str, gzip_level: int = 6, brotli_quality: int = 4):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, finish: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if finish else self._brotli.flush())
+        out = self._gzip.compress(data)
+        return out + self._gzip.flush(zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Compress responses with the best encoding the client accepts.
+
+    The decision is made on the first body message: responses that are already
+    encoded, of an incompressible or streaming-only type (server-sent events),
+    or complete and smaller than `minimum_size` pass through untouched. Streamed
+    responses are compressed chunk by chunk without a `Content-Length`.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = MINIMUM_SIZE,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http" and scope["method"] != "HEAD":
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Per response state of `CompressionMiddleware`."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        # Held back until the first body message shows whether to compress
+        self.start_message: dict | None = None
+        self.compressor: StreamCompressor | None = None
+
+    def _start_compressor(self, message: dict) -> StreamCompressor | None:
+        """Decide whether to compress and rewrite the start message's headers."""
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        more_body = message.get("more_body", False)
+        if (
+            self.start_message["status"] in (204, 304)
+            or "content-encoding" in headers
+            or not is_compressible(headers.get("content-type"))
+            or (
+                not more_body
+                and len(message.get("body", b"")) < self.middleware.minimum_size
+            )
+        ):
+            return None
+
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # The encoded body differs byte for byte, strong validators become weak
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        if "content-length" in headers:
+            del headers["content-length"]
+        return StreamCompressor(
+            self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality
+        )
+
+    def _compress(self, message: dict) -> dict:
+        more_body = message.get("more_body", False)
+        body = self.compressor.compress(message.get("body", b""), finish=not more_body)
+        return {**message, "body": body}
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        is_body = message["type"] == "http.response.body"
+        if self.start_message is None:
+            if self.compressor is not None and is_body:
+                message = self._compress(message)
+            await self._send(message)
+            return
+
+        if is_body:
+            self.compressor = self._start_compressor(message)
+        if self.compressor is not None:
+            message = self._compress(message)
+            if not message.get("more_body", False):
+                # The whole body is known, send its exact compressed length
+                headers = MutableHeaders(raw=self.start_message["headers"])
+                headers["Content-Length"] = str(len(message["body"]))
+        await self._send(self.start_message)
+        self.start_message = None
+        await self._send(message)
+
+
+class PrecompressedStaticMiddleware:
+    """Serve the files of `directory`, preferring their precompressed variants.
+
+    Files are indexed once at startup, so other requests only pay for a dict
+    lookup and paths outside `directory` can never be served. A `.br` or `.gz`
+    file next to an asset (see `precompress_directory`) is sent instead of the
+    asset when the client accepts that encoding.
+    """
+
+    def __init__(self, app, directory: str | Path):
+        self.app = app
+        self.directory = Path(directory)
+        self.files: dict[str, Path] = {}
+        suffixes = tuple(PRECOMPRESSED_SUFFIXES.values())
+        if self.directory.is_dir():
+            for path in self.directory.rglob("*"):
+                if path.is_file() and path.suffix not in suffixes:
+                    url_path = "/" + path.relative_to(self.directory).as_posix()
+                    self.files[url_path] = path
+
+    def file_response(self, path: Path, accept_encoding: str) -> FileResponse:
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        available = tuple(
+            encoding
+            for encoding, suffix in PRECOMPRESSED_SUFFIXES.items()
+            if path.with_name(path.name + suffix).is_file()
+        )
+        headers = {"Vary": "Accept-Encoding"} if available else {}
+        encoding = negotiate_encoding(accept_encoding, available)
+        if encoding is not None:
+            path = path.with_name(path.name + PRECOMPRESSED_SUFFIXES[encoding])
+            headers["Content-Encoding"] = encoding
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        path = None
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = self.files.get(scope["path"])
+        if path is None:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        await self.file_response(path, accept_encoding)(scope, receive, send)
+
+
+def precompress_directory(
+    directory: str | Path, minimum_size: int = MINIMUM_SIZE
+) -> list[Path]:
+    """Write `.gz` (and `.br`) variants next to the compressible files of `directory`.
+
+    Uses the highest compression levels since this runs once at build time.
+    Variants that would not be smaller than the original are skipped.
+
+    Returns:
+        The written variant files.
+    """
+    suffixes = tuple(PRECOMPRESSED_SUFFIXES.values())
+    written = []
+    for path in sorted(Path(directory).rglob("*")):
+        media_type = mimetypes.guess_type(path.name)[0]
+        if not path.is_file() or path.suffix in suffixes:
+            continue
+        data = path.read_bytes()
+        if len(data) < minimum_size or not is_compressible(media_type):
+            continue
+
+        for encoding in ENCODINGS:
+            if encoding == "br":
+                compressed = brotli.compress(data, quality=11)
+            else:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) >= len(data):
+                continue
+            variant = path.with_name(path.name + PRECOMPRESSED_SUFFIXES[encoding])
+            variant.write_bytes(compressed)
+            written.append(variant)
+            logger.info("{}: {} -> {} bytes", variant, len(data), len(compressed))
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress static assets.")
+    parser.add_argument("directory", type=Path)
+    precompress_directory(parser.parse_args().directory)
@@ -0,0 +1,115 @@
+"""Pool of ready-to-play movies so new games don't wait on TMDB."""
+
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from loguru import logger
+
+
+class GamePool:
+    """Keep up to `size` prepared movies per key, refilled in the background.
+
+    `take` hands out a prepared movie when one is available and otherwise loads
+    one synchronously. Either way a background refill tops the key back up, so
+    only the first game of a key pays the full TMDB latency.
+
+    Examples:
+        >>> pool = GamePool(lambda key: {"id": 1, "key": key}, size=0)
+        >>> pool.take(("popular", "backdrops"))
+        {'id': 1, 'key': ('popular', 'backdrops')}
+
+    Args:
+        loader: Prepares a movie for the given key, e.g. `(category, mode)`.
+        size: Movies kept per key, 0 disables pooling.
+        max_age: Seconds a prepared movie stays usable.
+        workers: Threads used for refills.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Any],
+        size: int = 3,
+        max_age: float = 60 * 60,
+        workers: int = 2,
+    ):
+        self.loader = loader
+        self.size = size
+        self.max_age = max_age
+        # key -> (prepared_at, movie), oldest first
+        self._items: defaultdict[Hashable, deque[tuple[float, Any]]] = defaultdict(
+            deque
+        )
+        self._refilling: set[Hashable] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="game-pool")
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._items.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def _pop_fresh(self, key: Hashable) -> Any | None:
+        now = time.time()
+        with self._lock:
+            items = self._items[key]
+            while items:
+                prepared_at, movie = items.popleft()
+                if now - prepared_at < self.max_age:
+                    return movie
+        return None
+
+    def take(self, key: Hashable) -> Any:
+        movie = self.take_ready(key)
+        return self.loader(key) if movie is None else movie
+
+    def take_ready(self, key: Hashable) -> Any | None:
+        """Like `take`, but None instead of loading when no movie is prepared."""
+        movie = self._pop_fresh(key)
+        self.refill(key)
+        return movie
+
+    def refill(self, key: Hashable) -> None:
+        """Top `key` back up to `size` in the background, at most once at a time."""
+        with self._lock:
+            if len(self._items[key]) >= self.size or key in self._refilling:
+                return
+            self._refilling.add(key)
+        self._executor.submit(self._refill, key)
+
+    def _refill(self, key: Hashable) -> None:
+        try:
+            while len(self._items[key]) < self.size:
+                movie = self.loader(key)
+                with self._lock:
+                    self._items[key].append((time.time(), movie))
+        except Exception as e:
+            logger.warning("Refilling game pool {} failed: {}", key, e)
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def snapshot(self) -> dict[Hashable, list[tuple[float, Any]]]:
+        with self._lock:
+            return {key: list(items) for key, items in self._items.items() if items}
+
+    def restore(self, state: dict[Hashable, list[tuple[float, Any]]]) -> int:
+        """Add prepared movies from `snapshot`, dropping those past `max_age`.
+
+        Returns:
+            The number of restored movies.
+        """
+        now = time.time()
+        restored = 0
+        with self._lock:
+            for key, items in state.items():
+                fresh = [item for item in items if now - item[0] < self.max_age]
+                free = max(self.size - len(self._items[key]), 0)
+                self._items[key].extend(fresh[:free])
+                restored += len(fresh[:free])
+        return restored
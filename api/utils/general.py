@@ -60,11 +60,12 @@ def is_module_installed(module_name: str, throw_error: bool = False) -> bool:
 def timing_decorator(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         result = func(*args, **kwargs)
-        end_time = time.time()
+        end_time = time.perf_counter()
+        # Formatting is left to loguru, which skips it below the configured level
         logger.info(
-            f"{func.__name__} took {end_time - start_time:.2f} seconds to execute"
+            "{} took {:.2f} seconds to execute", func.__name__, end_time - start_time
         )
         return result
 
@@ -0,0 +1,150 @@
+"""HTTP caching helpers shared by the FastHTML apps."""
+
+import hashlib
+
+from fasthtml.common import to_xml
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+
+# Browsers revalidate after `max-age`, shared caches (Vercel edge, reverse proxies)
+# keep the response for `s-maxage` and may serve it stale while refreshing.
+SEARCH_CACHE_MAX_AGE = 60
+SEARCH_CACHE_S_MAXAGE = 300
+SEARCH_CACHE_STALE_WHILE_REVALIDATE = 600
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so equivalent queries share a cache key.
+
+    Examples:
+        >>> normalize_query("  The   Matrix ")
+        'the matrix'
+
+    Args:
+        query: The raw search term.
+
+    Returns:
+        The lowercased query with surrounding and repeated whitespace removed.
+    """
+    return " ".join(query.split()).lower()
+
+
+def make_etag(content: str | bytes) -> str:
+    """Build a weak ETag from the response body.
+
+    The tag is weak so it stays valid when the body is re-encoded (e.g. gzip).
+
+    Examples:
+        >>> make_etag("<div></div>") == make_etag(b"<div></div>")
+        True
+
+    Args:
+        content: The rendered response body.
+
+    Returns:
+        A weak entity tag such as `W/"1a2b..."`.
+    """
+    if isinstance(content, str):
+        content = content.encode()
+    return f'W/"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an `If-None-Match` header against an ETag using weak comparison.
+
+    Examples:
+        >>> etag_matches('"abc", W/"def"', 'W/"def"')
+        True
+        >>> etag_matches("*", 'W/"def"')
+        True
+        >>> etag_matches(None, 'W/"def"')
+        False
+
+    Args:
+        if_none_match: The raw `If-None-Match` request header, if any.
+        etag: The current entity tag of the resource.
+
+    Returns:
+        True if the client already holds the current representation.
+    """
+    if not if_none_match:
+        return False
+
+    opaque_tag = etag.removeprefix("W/")
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(
+        candidate == "*" or candidate.removeprefix("W/") == opaque_tag
+        for candidate in candidates
+    )
+
+
+def cache_control(
+    max_age: int = SEARCH_CACHE_MAX_AGE,
+    s_maxage: int = SEARCH_CACHE_S_MAXAGE,
+    stale_while_revalidate: int = SEARCH_CACHE_STALE_WHILE_REVALIDATE,
+) -> str:
+    """Build a `Cache-Control` value for responses shared by every player.
+
+    Examples:
+        >>> cache_control(10, 20, 30)
+        'public, max-age=10, s-maxage=20, stale-while-revalidate=30'
+    """
+    return (
+        f"public, max-age={max_age}, s-maxage={s_maxage}, "
+        f"stale-while-revalidate={stale_while_revalidate}"
+    )
+
+
+def cached_html_response(request: Request, content, **cache_kwargs) -> Response:
+    """Render an HTML fragment as a publicly cacheable, conditional response.
+
+    Args:
+        request: The incoming request, used for `If-None-Match`.
+        content: An FT component (or tuple of them) or an already rendered string.
+        **cache_kwargs: Overrides forwarded to `cache_control`.
+
+    Returns:
+        A 304 response if the client's ETag is current, otherwise a 200 response
+        carrying the fragment, its ETag and `Cache-Control` headers.
+    """
+    body = content if isinstance(content, str) else to_xml(content)
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control(**cache_kwargs)}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return HTMLResponse(body, headers=headers)
+
+
+class PublicCacheMiddleware:
+    """Drop `Set-Cookie` from responses marked `Cache-Control: public`.
+
+    The session middleware re-sends the session cookie on every response, which
+    makes shared caches refuse to store them. Public responses never depend on the
+    session, so the cookie can safely be left out. Add it after the session
+    middleware so it wraps it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                is_public = any(
+                    key == b"cache-control" and b"public" in value
+                    for key, value in headers
+                )
+                if is_public:
+                    message["headers"] = [
+                        (key, value) for key, value in headers if key != b"set-cookie"
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,159 @@
+"""Loguru configuration: queued sinks, JSON output and per call site sampling."""
+
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+DEFAULT_LOG_CONFIG_PATH = (
+    Path(__file__).resolve().parents[2] / "configs" / "logger" / "log_config.json"
+)
+
+DEFAULT_LOG_CONFIG = {
+    "level": "INFO",
+    "sink": "stderr",
+    "serialize": False,
+    "enqueue": True,
+    "sample_rates": {},
+    "rate_limits": {},
+}
+
+
+class CallSiteFilter:
+    """Loguru filter that samples and rate limits messages per call site.
+
+    Call sites are configured by `"module"` or `"module:function"` keys, the more
+    specific key wins. The filter runs on the caller's thread for every message,
+    so it is deliberately lock free: concurrent callers may let a few extra
+    messages through a rate limit, but never wait on each other.
+
+    Examples:
+        >>> log_filter = CallSiteFilter(
+        ...     level="INFO", rate_limits={"api.utils.movie": 1}, burst=1
+        ... )
+        >>> record = {
+        ...     "name": "api.utils.movie",
+        ...     "function": "get_movie_backdrops",
+        ...     "line": 1,
+        ...     "level": logger.level("INFO"),
+        ... }
+        >>> log_filter(record), log_filter(record)
+        (True, False)
+
+    Args:
+        level: Minimum level name that passes the filter.
+        sample_rates: Fraction (0-1) of messages to keep per call site.
+        rate_limits: Maximum messages per second per call site (and source line).
+        burst: Number of messages a rate limited call site may emit at once.
+    """
+
+    def __init__(
+        self,
+        level: str = "INFO",
+        sample_rates: dict[str, float] | None = None,
+        rate_limits: dict[str, float] | None = None,
+        burst: int = 10,
+    ):
+        self.levelno = logger.level(level).no
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.burst = burst
+        # (module, function, line) -> (tokens, last refill time)
+        self._buckets: dict[tuple[str, str, int], tuple[float, float]] = {}
+
+    @staticmethod
+    def _lookup(config: dict[str, float], name: str, function: str) -> float | None:
+        value = config.get(f"{name}:{function}")
+        return config.get(name) if value is None else value
+
+    def _take_token(self, site: tuple[str, str, int], rate: float) -> bool:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(site, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            self._buckets[site] = (tokens, now)
+            return False
+        self._buckets[site] = (tokens - 1, now)
+        return True
+
+    def __call__(self, record) -> bool:
+        if record["level"].no < self.levelno:
+            return False
+
+        name, function = record["name"], record["function"]
+
+        sample_rate = self._lookup(self.sample_rates, name, function)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+
+        rate = self._lookup(self.rate_limits, name, function)
+        if rate is not None:
+            return self._take_token((name, function, record["line"]), rate)
+
+        return True
+
+
+def load_log_config(config_path: str | Path | None = None) -> dict:
+    """Load the logging configuration.
+
+    Args:
+        config_path: Path to a JSON config. Defaults to the `LOG_CONFIG_PATH`
+            env var or `configs/logger/log_config.json`.
+
+    Returns:
+        The config merged over `DEFAULT_LOG_CONFIG`. The `LOG_LEVEL` env var,
+        if set, overrides the configured level.
+    """
+    config_path = Path(
+        config_path or os.getenv("LOG_CONFIG_PATH") or DEFAULT_LOG_CONFIG_PATH
+    )
+
+    config = dict(DEFAULT_LOG_CONFIG)
+    if config_path.is_file():
+        with config_path.open() as f:
+            config.update(json.load(f))
+
+    if os.getenv("LOG_LEVEL"):
+        config["level"] = os.environ["LOG_LEVEL"]
+
+    return config
+
+
+def setup_logging(config_path: str | Path | None = None) -> int:
+    """Replace loguru's handlers with one configured from the log config.
+
+    With `enqueue` the sink is written by a background thread, so request handlers
+    only pay for the filter and putting the message on a queue. Messages below the
+    configured level return before loguru builds a record.
+
+    Args:
+        config_path: Forwarded to `load_log_config`.
+
+    Returns:
+        The id of the added loguru handler.
+    """
+    config = load_log_config(config_path)
+
+    sinks = {"stderr": sys.stderr, "stdout": sys.stdout}
+    sink = sinks.get(config["sink"], config["sink"])
+
+    logger.remove()
+    return logger.add(
+        sink,
+        # Also set on the sink, so loguru drops lower levels before building records
+        level=config["level"],
+        filter=CallSiteFilter(
+            level=config["level"],
+            sample_rates=config["sample_rates"],
+            rate_limits=config["rate_limits"],
+            burst=config.get("burst", 10),
+        ),
+        serialize=config["serialize"],
+        enqueue=config["enqueue"],
+        backtrace=False,
+        diagnose=False,
+    )
@@ -0,0 +1,254 @@
+"""Compact, slotted records for the movies and games held in caches and sessions."""
+
+import re
+import sys
+from dataclasses import dataclass, replace
+
+# Shared placeholder for missing TMDB fields
+NOT_AVAILABLE = "N/A"
+
+# Guesses per game, also the number of images a game can reveal
+MAX_GUESSES = 5
+
+# Bump when the session layout of `GameState` changes, old games are restarted
+GAME_SESSION_VERSION = 1
+
+# TMDB image paths look like "/kXfqcdQKsToO0OUXHcrrNCHDBzO.jpg"
+_IMAGE_PATH_RE = re.compile(r"/([A-Za-z0-9]+)\.jpg")
+_IMAGE_CODE_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def _intern(value: str | None) -> str | None:
+    return None if value is None else sys.intern(value)
+
+
+def encode_image_path(path: str) -> str:
+    """Encode a TMDB image path compactly, dropping the shared "/" and ".jpg".
+
+    Paths in an unexpected format are kept as is.
+
+    Examples:
+        >>> encode_image_path("/kXfqcdQKsToO0OUXHcrrNCHDBzO.jpg")
+        'kXfqcdQKsToO0OUXHcrrNCHDBzO'
+        >>> decode_image_path(encode_image_path("/kXfqcdQKsToO0OUXHcrrNCHDBzO.jpg"))
+        '/kXfqcdQKsToO0OUXHcrrNCHDBzO.jpg'
+        >>> encode_image_path("/poster.png")
+        '/poster.png'
+    """
+    match = _IMAGE_PATH_RE.fullmatch(path)
+    return match[1] if match else path
+
+
+def decode_image_path(code: str) -> str:
+    """Inverse of `encode_image_path`."""
+    return f"/{code}.jpg" if _IMAGE_CODE_RE.fullmatch(code) else code
+
+
+@dataclass(frozen=True, slots=True)
+class ImageInfo:
+    """Metadata of a single TMDB image."""
+
+    code: str
+    width: int
+    height: int
+    language: str | None
+    vote_average: float
+    vote_count: int
+
+    @property
+    def file_path(self) -> str:
+        return decode_image_path(self.code)
+
+
+@dataclass(frozen=True, slots=True)
+class MovieImages:
+    """Posters and backdrops of a movie, fetched with a single TMDB request."""
+
+    posters: tuple[ImageInfo, ...]
+    backdrops: tuple[ImageInfo, ...]
+
+    @classmethod
+    def from_tmdb(cls, images) -> "MovieImages":
+        def to_infos(items) -> tuple[ImageInfo, ...]:
+            return tuple(
+                ImageInfo(
+                    code=encode_image_path(img.file_path),
+                    width=getattr(img, "width", 0),
+                    height=getattr(img, "height", 0),
+                    # Only a handful of languages, share one string per language
+                    language=_intern(getattr(img, "iso_639_1", None)),
+                    vote_average=getattr(img, "vote_average", 0.0),
+                    vote_count=getattr(img, "vote_count", 0),
+                )
+                for img in items
+            )
+
+        return cls(
+            posters=to_infos(getattr(images, "posters", [])),
+            backdrops=to_infos(getattr(images, "backdrops", [])),
+        )
+
+    def codes(self, image_type: str) -> tuple[str, ...]:
+        return tuple(img.code for img in getattr(self, image_type))
+
+    def game_images(self, image_type: str) -> tuple[ImageInfo, ...]:
+        """Images in the order a game reveals them.
+
+        Posters with a language usually print the title, which gives the answer
+        away, so textless posters come first and localized ones only fill up.
+
+        Examples:
+            >>> poster = ImageInfo("a", 2000, 3000, "en", 5.0, 1)
+            >>> textless = ImageInfo("b", 2000, 3000, None, 5.0, 1)
+            >>> images = MovieImages(posters=(poster, textless), backdrops=())
+            >>> [img.code for img in images.game_images("posters")]
+            ['b', 'a']
+        """
+        images = getattr(self, image_type)
+        if image_type != "posters":
+            return images
+        return tuple(sorted(images, key=lambda img: img.language is not None))
+
+    def playable_count(self, image_type: str) -> int:
+        """Number of images that don't give the answer away, textless posters only."""
+        if image_type != "posters":
+            return len(self.backdrops)
+        return sum(img.language is None for img in self.posters)
+
+    def file_paths(self, image_type: str) -> list[str]:
+        return [img.file_path for img in getattr(self, image_type)]
+
+
+@dataclass(frozen=True, slots=True)
+class MovieRecord:
+    """A movie as cached from TMDB category pages and searches, and played in games.
+
+    Image paths are stored encoded (see `encode_image_path`), use `image_paths`
+    to get TMDB paths back. Records are immutable so caches, game pools and games
+    can share them.
+
+    Examples:
+        >>> movie = MovieRecord(603, "The Matrix", backdrops=("abc",))
+        >>> movie.image_paths("backdrops")
+        ['/abc.jpg']
+        >>> movie.release_date
+        'N/A'
+    """
+
+    id: int
+    title: str
+    overview: str = NOT_AVAILABLE
+    release_date: str = NOT_AVAILABLE
+    backdrops: tuple[str, ...] = ()
+    posters: tuple[str, ...] = ()
+
+    @classmethod
+    def from_tmdb(cls, movie) -> "MovieRecord":
+        """Keep the fields the app uses from a tmdbv3api result."""
+        return cls(
+            id=movie.id,
+            title=getattr(movie, "title", None),
+            overview=getattr(movie, "overview", NOT_AVAILABLE),
+            release_date=getattr(movie, "release_date", NOT_AVAILABLE),
+        )
+
+    def with_images(self, images: MovieImages) -> "MovieRecord":
+        """Add the images, in the order `MovieImages.game_images` reveals them."""
+        return replace(
+            self,
+            **{
+                image_type: tuple(img.code for img in images.game_images(image_type))
+                for image_type in ("backdrops", "posters")
+            },
+        )
+
+    def image_paths(self, image_type: str) -> list[str]:
+        return [decode_image_path(code) for code in getattr(self, image_type)]
+
+
+@dataclass(slots=True)
+class GameState:
+    """State of a game in progress, stored in the session with `to_session`.
+
+    Examples:
+        >>> movie = MovieRecord(603, "The Matrix", backdrops=("a", "b"), posters=("c",))
+        >>> game = GameState.new(movie, category="top_rated")
+        >>> game.image_path
+        '/a.jpg'
+        >>> game.movie.posters
+        ()
+        >>> GameState.from_session(game.to_session()) == game
+        True
+    """
+
+    movie: MovieRecord
+    category: str = "popular"
+    mode: str = "backdrops"
+    image_index: int = 0
+    guesses_remaining: int = MAX_GUESSES
+
+    @classmethod
+    def new(
+        cls, movie: MovieRecord, category: str = "popular", mode: str = "backdrops"
+    ) -> "GameState":
+        # Only keep the images the game can reveal, the state lives in the session
+        images = {"backdrops": (), "posters": ()}
+        images[mode] = getattr(movie, mode)[:MAX_GUESSES]
+        movie = replace(movie, **images)
+        return cls(movie=movie, category=category, mode=mode)
+
+    @property
+    def images(self) -> tuple[str, ...]:
+        return getattr(self.movie, self.mode)
+
+    @property
+    def image_path(self) -> str | None:
+        """TMDB path of the image currently shown, if the movie has any."""
+        if self.image_index >= len(self.images):
+            return None
+        return decode_image_path(self.images[self.image_index])
+
+    def next_image(self) -> str | None:
+        """Reveal the next image, None when the game is out of guesses or images."""
+        if self.guesses_remaining <= 0 or self.image_index + 1 >= len(self.images):
+            return None
+        self.image_index += 1
+        return self.image_path
+
+    def to_session(self) -> list:
+        """Serialize to a flat list, which keeps the signed session cookie small."""
+        movie = self.movie
+        return [
+            GAME_SESSION_VERSION,
+            movie.id,
+            movie.title,
+            movie.overview,
+            movie.release_date,
+            list(self.images),
+            self.category,
+            self.mode,
+            self.image_index,
+            self.guesses_remaining,
+        ]
+
+    @classmethod
+    def from_session(cls, data) -> "GameState | None":
+        """Inverse of `to_session`, None for missing or outdated session data."""
+        if not isinstance(data, list) or not data or data[0] != GAME_SESSION_VERSION:
+            return None
+        (
+            _,
+            movie_id,
+            title,
+            overview,
+            release_date,
+            images,
+            category,
+            mode,
+            image_index,
+            guesses_remaining,
+        ) = data
+        movie = MovieRecord(
+            movie_id, title, overview, release_date, **{mode: tuple(images)}
+        )
+        return cls(movie, category, mode, image_index, guesses_remaining)
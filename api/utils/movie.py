@@ -5,19 +5,47 @@ import random
 from loguru import logger
 from thefuzz import fuzz
 from tmdbv3api import Movie, Search, TMDb
+from tmdbv3api.exceptions import TMDbException
 
 from api.utils.general import timing_decorator
+from api.utils.models import MovieImages, MovieRecord
+from api.utils.resilience import (
+    CircuitBreaker,
+    ResilientCaller,
+    StaleCache,
+    TimeoutHTTPAdapter,
+    UpstreamUnavailableError,
+)
 
 tmdb = TMDb()
+# tmdbv3api caches every response forever, `tmdb_cache` below expires them instead
+tmdb.cache = False
+TMDb._session.mount("https://", TimeoutHTTPAdapter(timeout=10.0))
 
 movie_api = Movie()
 search_api = Search()
 
+# Seconds a TMDB response is served before being refreshed in the background
+CATEGORY_TTL = 10 * 60
+IMAGES_TTL = 24 * 60 * 60
+SEARCH_TTL = 10 * 60
+
+tmdb_cache = StaleCache(maxsize=4096)
+tmdb_caller = ResilientCaller(
+    breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30.0), max_timeout=5.0
+)
+
 TMDB_IMG_BASE_PATH = "https://image.tmdb.org/t/p/w500"
 
 # Fallback image URL when no backdrop is found
 FALLBACK_IMAGE_URL = "https://placehold.co/500x281/808080/FFFFFF/png?text=No+Image"
 
+# Image types a game can be played with, they match `MovieImages` attributes
+IMAGE_TYPES = ("backdrops", "posters")
+
+# Upper bound for user supplied search limits, keeps the cache key space small
+MAX_SEARCH_LIMIT = 10
+
 # Available movie categories and their methods
 MOVIE_CATEGORIES = {
     "popular": movie_api.popular,
@@ -27,7 +55,32 @@ MOVIE_CATEGORIES = {
 }
 
 
-def get_random_movie(category: str = "popular") -> Movie:
+def cached_tmdb_call(operation: str, key, func, ttl: float):
+    """Call TMDB through the stale-while-revalidate cache and resilience layer.
+
+    Args:
+        operation: Name of the call, used for latency tracking and cache keys.
+        key: Identifies the call within the operation.
+        func: Zero argument callable performing the TMDB request.
+        ttl: Seconds the response is served before being refreshed.
+
+    Returns:
+        The (possibly stale) TMDB response.
+
+    Raises:
+        UpstreamUnavailableError: If TMDB can't be reached and nothing is cached.
+    """
+    return tmdb_cache.get_or_load(
+        (operation, key), lambda: tmdb_caller(operation, func), ttl=ttl
+    )
+
+
+def to_records(results) -> tuple[MovieRecord, ...]:
+    """Convert tmdbv3api results to the compact records kept in `tmdb_cache`."""
+    return tuple(MovieRecord.from_tmdb(result) for result in results)
+
+
+def get_random_movie(category: str = "popular") -> MovieRecord:
     """Get a random movie from specified TMDB category.
 
     Args:
@@ -35,15 +88,39 @@ def get_random_movie(category: str = "popular") -> Movie:
                  Options: "popular", "top_rated", "now_playing", "upcoming"
 
     Returns:
-        A Movie object representing a randomly selected movie from the specified category.
+        A randomly selected movie from the specified category, without images.
     """
-    # Get the category method or default to popular if invalid
-    category_method = MOVIE_CATEGORIES.get(category, MOVIE_CATEGORIES["popular"])
+    # Default to popular if invalid
+    if category not in MOVIE_CATEGORIES:
+        category = "popular"
     # Get movies from the category
-    movies = category_method()
+    fetch_page = MOVIE_CATEGORIES[category]
+    movies = cached_tmdb_call(
+        "category", category, lambda: to_records(fetch_page()), CATEGORY_TTL
+    )
     return random.choice(movies)
 
 
+def get_movie_images(movie_id: int) -> MovieImages:
+    """Get the image metadata of a movie, shared by posters, backdrops and games.
+
+    The full TMDB image listing is fetched once per movie and cached in its compact
+    `MovieImages` form, so every image type costs at most one upstream call.
+
+    Args:
+        movie_id: The TMDB ID of the movie.
+
+    Returns:
+        The posters and backdrops of the movie.
+    """
+
+    def fetch_images() -> MovieImages:
+        images = movie_api.images(movie_id=movie_id, include_image_language="en,null")
+        return MovieImages.from_tmdb(images)
+
+    return cached_tmdb_call("images", movie_id, fetch_images, IMAGES_TTL)
+
+
 @timing_decorator
 def get_movie_posters(movie_id: int) -> list[str]:
     """Get all available posters for a movie.
@@ -61,8 +138,7 @@ def get_movie_posters(movie_id: int) -> list[str]:
     Returns:
         A list of strings representing poster file paths.
     """
-    images = movie_api.images(movie_id=movie_id, include_image_language="en,null")
-    return [img.file_path for img in images.posters]
+    return get_movie_images(movie_id).file_paths("posters")
 
 
 @timing_decorator
@@ -82,8 +158,25 @@ def get_movie_backdrops(movie_id: int) -> list[str]:
     Returns:
         A list of strings representing backdrop file paths.
     """
-    images = movie_api.images(movie_id=movie_id, include_image_language="en,null")
-    return [img.file_path for img in images.backdrops]
+    return get_movie_images(movie_id).file_paths("backdrops")
+
+
+def get_backdrop_image_url(movie_id: int) -> str:
+    """Get the URL of the first backdrop of a movie.
+
+    Args:
+        movie_id: The TMDB ID of the movie.
+
+    Returns:
+        The backdrop URL, or `FALLBACK_IMAGE_URL` if the movie has no backdrop,
+        TMDB rejects the lookup or is unavailable. A missing backdrop shouldn't
+        fail a whole search.
+    """
+    try:
+        backdrops = get_movie_backdrops(movie_id)
+    except (UpstreamUnavailableError, TMDbException):
+        return FALLBACK_IMAGE_URL
+    return f"{TMDB_IMG_BASE_PATH}{backdrops[0]}" if backdrops else FALLBACK_IMAGE_URL
 
 
 @timing_decorator
@@ -109,15 +202,20 @@ def fuzzy_search_movies(
         A list of movie dictionaries that match the search criteria, or None if no matches found.
     """
     # Get initial results from TMDB
-    results = search_api.movies(query)
+    results = cached_tmdb_call(
+        "search",
+        query.lower(),
+        lambda: to_records(search_api.movies(query)),
+        SEARCH_TTL,
+    )
 
     # Apply fuzzy matching
     fuzzy_matches = []
     for result in results:
         # Safely get title, skip if not a string
-        title = getattr(result, "title", None)
+        title = result.title
         if not isinstance(title, str):
-            logger.warning(f"Invalid title type for movie: {type(title)}")
+            logger.warning("Invalid title type for movie: {}", type(title))
             continue
 
         # Calculate similarity ratio
@@ -126,17 +224,15 @@ def fuzzy_search_movies(
         if ratio >= threshold:
             backdrop_image_url = FALLBACK_IMAGE_URL
             if include_backdrops is True:
-                backdrops = get_movie_backdrops(result.id)
-                if backdrops:
-                    backdrop_image_url = f"{TMDB_IMG_BASE_PATH}{backdrops[0]}"
+                backdrop_image_url = get_backdrop_image_url(result.id)
 
             fuzzy_matches.append(
                 {
                     "title": title,
                     "similarity": ratio,
                     "id": result.id,
-                    "release_date": getattr(result, "release_date", "N/A"),
-                    "overview": getattr(result, "overview", "N/A"),
+                    "release_date": result.release_date,
+                    "overview": result.overview,
                     "backdrop_image_url": backdrop_image_url,
                 }
             )
@@ -152,40 +248,45 @@ def fuzzy_search_movies(
 
 @timing_decorator
 def get_random_movie_with_details(
-    min_backdrops: int = 5,
+    min_images: int = 5,
     category: str = "popular",
     depth: int = 0,
     max_depth: int = 5,
-) -> dict:
-    """Get a random movie with at least specified number of backdrops.
+    image_type: str = "backdrops",
+) -> MovieRecord:
+    """Get a random movie with at least specified number of images.
+
+    Only textless posters count towards `min_images`, localized ones usually print
+    the title. They are still played after the textless ones when a movie has
+    too few.
 
     Args:
-        min_backdrops: Minimum number of backdrops required (default: 5)
+        min_images: Minimum number of images of `image_type` required (default: 5)
         category: The category to select from (default: "popular")
                  Options: "popular", "top_rated", "now_playing", "upcoming"
         depth: Current recursion depth (default: 0)
+        max_depth: Maximum recursion depth (default: 5)
+        image_type: The images the game is played with (default: "backdrops")
+                 Options: "backdrops", "posters"
 
     Returns:
-        A dictionary containing movie details including title, backdrops, etc.
+        The movie with its backdrops and posters. Once `max_depth` is reached the
+        last candidate is returned even if it has fewer than `min_images` images.
     """
     movie = get_random_movie(category)
-    backdrops = get_movie_backdrops(movie.id)
+    images = get_movie_images(movie.id)
+    image_count = images.playable_count(image_type)
 
-    # Recursively try another movie if this one doesn't have enough backdrops
-    if len(backdrops) < min_backdrops:
+    # Recursively try another movie if this one doesn't have enough images
+    if image_count < min_images and depth < max_depth:
         logger.debug(
-            f"Movie {movie.title} has {len(backdrops)} backdrops, trying another..."
+            "Movie {} has {} {}, trying another...",
+            movie.title,
+            image_count,
+            image_type,
         )
-        return (
-            get_random_movie_with_details(min_backdrops, category, depth + 1)
-            if depth < max_depth
-            else {"error": "Max recursion depth reached"}
+        return get_random_movie_with_details(
+            min_images, category, depth + 1, max_depth, image_type
         )
 
-    return {
-        "id": movie.id,
-        "title": movie.title,
-        "backdrops": backdrops,
-        "overview": getattr(movie, "overview", "N/A"),
-        "release_date": getattr(movie, "release_date", "N/A"),
-    }
+    return movie.with_images(images)
@@ -0,0 +1,240 @@
+"""Opt-in statistical request profiling with a bounded on-disk profile store."""
+
+import hashlib
+import hmac
+import itertools
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextvars import Context, ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import anyio.to_thread
+from loguru import logger
+
+PROFILE_HEADER = "x-profile"
+PROFILE_SUFFIX = ".collapsed"
+
+# Profiler of the request being handled, see `SamplingProfiler`
+active_profiler: ContextVar["SamplingProfiler | None"] = ContextVar(
+    "active_profiler", default=None
+)
+
+
+@dataclass
+class ProfilingConfig:
+    """Profiling settings, usually read from the environment with `from_env`.
+
+    Attributes:
+        enabled: Profile requests selected by `every_n`.
+        every_n: Profile every Nth request when enabled, 0 disables sampling.
+        secret: HMAC secret for the `X-Profile` header and admin routes.
+        directory: Where profiles are stored.
+        max_profiles: Number of profiles kept, oldest ones are deleted first.
+        interval: Seconds between stack samples.
+    """
+
+    enabled: bool = False
+    every_n: int = 0
+    secret: str | None = None
+    directory: Path = field(
+        default_factory=lambda: Path(tempfile.gettempdir()) / "movie-guess-profiles"
+    )
+    max_profiles: int = 50
+    interval: float = 0.005
+
+    @classmethod
+    def from_env(cls) -> "ProfilingConfig":
+        defaults = cls()
+        return cls(
+            enabled=os.getenv("PROFILING_ENABLED", "false").lower() == "true",
+            every_n=int(os.getenv("PROFILING_EVERY_N", defaults.every_n)),
+            secret=os.getenv("PROFILING_SECRET") or None,
+            directory=Path(os.getenv("PROFILING_DIR", defaults.directory)),
+            max_profiles=int(
+                os.getenv("PROFILING_MAX_PROFILES", defaults.max_profiles)
+            ),
+            interval=float(os.getenv("PROFILING_INTERVAL", defaults.interval)),
+        )
+
+
+def sign_profile_token(secret: str, ttl: int = 300) -> str:
+    """Create a value for the `X-Profile` header that is valid for `ttl` seconds.
+
+    Examples:
+        >>> token = sign_profile_token("secret")
+        >>> verify_profile_token("secret", token)
+        True
+        >>> verify_profile_token("other", token)
+        False
+    """
+    expires = str(int(time.time()) + ttl)
+    signature = hmac.new(secret.encode(), expires.encode(), hashlib.sha256)
+    return f"{expires}.{signature.hexdigest()}"
+
+
+def verify_profile_token(secret: str | None, token: str | None) -> bool:
+    """Check a token created by `sign_profile_token` and that it has not expired."""
+    if not secret or not token or "." not in token:
+        return False
+
+    expires, signature = token.split(".", 1)
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256)
+    if not hmac.compare_digest(signature, expected.hexdigest()):
+        return False
+    return expires.isdigit() and int(expires) >= time.time()
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the threads that run one request's handlers.
+
+    Sync route handlers run in Starlette's (anyio) threadpool, which runs them in
+    a copy of the request's context. While `active_profiler` is set to this
+    profiler, threads running such a copy are sampled, so concurrent requests,
+    background threads and idle workers stay out of the profile. Coroutines on
+    the shared event loop and upstream calls handed to other executors are not
+    attributed, time spent waiting on them shows up in the handler's stack.
+    Each stack is rooted at its thread name and counted in collapsed stack
+    format, which flamegraph.pl and speedscope can both import.
+    """
+
+    def __init__(self, interval: float = 0.005, max_duration: float = 30.0):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _runs_request(self, frames: list) -> bool:
+        """Whether a thread's worker loop is running a context of this request."""
+        # The worker loop (anyio's `WorkerThread.run`) sits at the bottom of the stack
+        for frame in reversed(frames):
+            if frame.f_code.co_name == "run":
+                context = frame.f_locals.get("context")
+                if isinstance(context, Context):
+                    return context.get(active_profiler) is self
+        return False
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, top_frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            frame = top_frame
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            if not self._runs_request(frames):
+                continue
+
+            stack = [
+                f"{frame.f_code.co_name} ({Path(frame.f_code.co_filename).name})"
+                for frame in reversed(frames)
+            ]
+            thread_name = names.get(thread_id, str(thread_id))
+            self.stacks[";".join([thread_name, *stack])] += 1
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            self._sample()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the profile in collapsed stack format."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.items())
+
+
+class ProfileStore:
+    """Bounded ring of profiles on disk, the oldest are removed past `max_profiles`."""
+
+    def __init__(self, directory: Path, max_profiles: int = 50):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def names(self) -> list[str]:
+        """Profile names, newest first."""
+        if not self.directory.is_dir():
+            return []
+        paths = self.directory.glob(f"*{PROFILE_SUFFIX}")
+        return sorted((path.name for path in paths), reverse=True)
+
+    def path(self, name: str) -> Path | None:
+        """Resolve a profile name to its path, None for unknown or unsafe names."""
+        if Path(name).name != name or name not in self.names():
+            return None
+        return self.directory / name
+
+    def save(self, method: str, path: str, profile: str) -> str:
+        slug = re.sub(r"[^a-zA-Z0-9]+", "_", path).strip("_") or "root"
+        name = f"{time.time_ns()}-{method.lower()}-{slug}{PROFILE_SUFFIX}"
+
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / name).write_text(profile)
+            for old_name in self.names()[self.max_profiles :]:
+                (self.directory / old_name).unlink(missing_ok=True)
+
+        return name
+
+
+class ProfilingMiddleware:
+    """Profile selected requests and store them in a `ProfileStore`.
+
+    A request is profiled when it carries a valid signed `X-Profile` header, or
+    when profiling is enabled and it is every `every_n`-th request. Other requests
+    only pay for a header lookup and a counter increment.
+    """
+
+    def __init__(self, app, config: ProfilingConfig, store: ProfileStore):
+        self.app = app
+        self.config = config
+        self.store = store
+        self._counter = itertools.count(1)
+
+    def should_profile(self, scope) -> bool:
+        if self.config.secret:
+            headers = dict(scope.get("headers", []))
+            token = headers.get(PROFILE_HEADER.encode())
+            if token and verify_profile_token(self.config.secret, token.decode()):
+                return True
+
+        every_n = self.config.every_n
+        return (
+            self.config.enabled and every_n > 0 and next(self._counter) % every_n == 0
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler(interval=self.config.interval)
+        token = active_profiler.set(profiler)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            active_profiler.reset(token)
+            # Joining the sampler and writing files would block the event loop
+            name = await anyio.to_thread.run_sync(
+                self._store, profiler, scope["method"], scope["path"]
+            )
+            logger.info("Stored profile {}", name)
+
+    def _store(self, profiler: SamplingProfiler, method: str, path: str) -> str:
+        return self.store.save(method, path, profiler.stop())
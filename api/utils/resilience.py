@@ -0,0 +1,441 @@
+"""Deadlines, hedged calls, a circuit breaker and a stale-while-revalidate cache."""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Hashable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Any
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+# Responses from this status up mean the upstream failed, not the request
+SERVER_ERROR_STATUS = 500
+
+# Absolute deadline (time.monotonic) of the request being handled, if any
+request_deadline: ContextVar[float | None] = ContextVar(
+    "request_deadline", default=None
+)
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when an upstream call fails, times out or its circuit is open."""
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether `error` means the upstream is unhealthy, rather than the call invalid.
+
+    Only connection errors, timeouts and 5xx responses count. Client and config
+    errors, like an unknown movie id or a missing API key, say nothing about the
+    upstream's health.
+
+    Examples:
+        >>> is_upstream_failure(requests.ConnectionError("refused"))
+        True
+        >>> is_upstream_failure(ValueError("No API key found."))
+        False
+    """
+    if isinstance(error, requests.HTTPError):
+        return (
+            error.response is None or error.response.status_code >= SERVER_ERROR_STATUS
+        )
+    return isinstance(
+        error,
+        requests.ConnectionError
+        | requests.Timeout
+        | ConnectionError
+        | TimeoutError
+        | UpstreamUnavailableError,
+    )
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter applying a default socket timeout to every request.
+
+    Calls abandoned by a deadline keep running in the background, this bounds
+    how long they can hold on to a worker thread. 5xx responses are raised as
+    `requests.HTTPError`, so they are told apart from client errors even by
+    API clients that only look at the response body.
+    """
+
+    def __init__(self, *args, timeout: float = 10.0, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        response = super().send(request, **kwargs)
+        if response.status_code >= SERVER_ERROR_STATUS:
+            raise requests.HTTPError(
+                f"{response.status_code} Server Error", response=response
+            )
+        return response
+
+
+class LatencyTracker:
+    """Rolling window of call latencies used to pick the hedging delay.
+
+    Examples:
+        >>> tracker = LatencyTracker(window=100, min_samples=10)
+        >>> tracker.p95() is None
+        True
+        >>> for latency in range(100):
+        ...     tracker.record(latency / 100)
+        >>> tracker.p95()
+        0.95
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def p95(self) -> float | None:
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(len(samples) * 0.95)]
+
+
+class CircuitBreaker:
+    """Fail fast after `failure_threshold` consecutive failures.
+
+    Once open, calls are rejected for `reset_timeout` seconds, after which a
+    single trial call is let through (half-open). Its outcome closes or reopens
+    the circuit.
+
+    Examples:
+        >>> breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        >>> breaker.record_failure()
+        >>> breaker.allow()
+        True
+        >>> breaker.record_failure()
+        >>> breaker.allow()
+        False
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self) -> None:
+        """End a call that says nothing about upstream health, freeing the trial."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Run upstream calls with a deadline, hedging and a circuit breaker.
+
+    The call deadline is the smaller of `max_timeout` and what is left of the
+    current request's budget (see `DeadlineMiddleware`). When the first attempt
+    is slower than the operation's recent p95, a second identical attempt is
+    started and whichever finishes first wins. Upstream failures (see
+    `is_upstream_failure`) are raised as `UpstreamUnavailableError`, other
+    errors are raised unchanged and don't count against the circuit breaker.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker | None = None,
+        max_timeout: float = 5.0,
+        max_workers: int = 32,
+    ):
+        self.breaker = breaker or CircuitBreaker()
+        self.max_timeout = max_timeout
+        self.trackers: dict[str, LatencyTracker] = {}
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="upstream")
+
+    def timeout(self) -> float:
+        deadline = request_deadline.get()
+        if deadline is None:
+            return self.max_timeout
+        return min(self.max_timeout, deadline - time.monotonic())
+
+    def _admit(self, operation: str) -> float:
+        """Return the call's timeout, raising if it can't be attempted at all."""
+        # Checked before `allow`, which may hand out the half-open trial call
+        timeout = self.timeout()
+        if timeout <= 0:
+            raise UpstreamUnavailableError(f"{operation}: request budget exhausted")
+        if not self.breaker.allow():
+            raise UpstreamUnavailableError(f"{operation}: circuit is open")
+        return timeout
+
+    def __call__(self, operation: str, func: Callable[[], Any]) -> Any:
+        timeout = self._admit(operation)
+        tracker = self.trackers.setdefault(operation, LatencyTracker())
+        start = time.monotonic()
+        deadline = start + timeout
+        hedge_at = None if (p95 := tracker.p95()) is None else start + p95
+
+        pending: set[Future] = {self._executor.submit(func)}
+        error: BaseException | None = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(
+                pending, timeout=wake_at - now, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    tracker.record(time.monotonic() - start)
+                    self.breaker.record_success()
+                    return future.result()
+                if not is_upstream_failure(error):
+                    self.breaker.release()
+                    raise error
+
+            if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                logger.debug("Hedging slow {} call", operation)
+                pending.add(self._executor.submit(func))
+                hedge_at = None
+
+        if pending:
+            error = None
+        self._record_failure(timeout, error)
+        if error is not None:
+            raise UpstreamUnavailableError(f"{operation}: {error}") from error
+        raise UpstreamUnavailableError(f"{operation}: deadline exceeded")
+
+    def _record_failure(self, timeout: float, error: BaseException | None) -> None:
+        """Count a call that failed with `error`, or ran out of time if None."""
+        if error is None and timeout < self.max_timeout:
+            # The request's own budget ran out first, upstream wasn't too slow
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+
+
+class StaleCache:
+    """Bounded LRU cache that serves stale entries while refreshing them.
+
+    Entries younger than `ttl` are returned as is. Older entries are still
+    returned, up to `stale_ttl`, while a single background refresh replaces
+    them. If loading fails the last known value is served instead of the error.
+    """
+
+    def __init__(self, maxsize: int = 1024, refresh_workers: int = 4):
+        self.maxsize = maxsize
+        # key -> (value, loaded_at, stale_ttl)
+        self._entries: OrderedDict[Hashable, tuple[Any, float, float]] = OrderedDict()
+        self._refreshing: set[Hashable] = set()
+        self._loading: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            refresh_workers, thread_name_prefix="cache-refresh"
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        loaded_at: float | None = None,
+        stale_ttl: float = float("inf"),
+    ) -> None:
+        with self._lock:
+            self._entries[key] = (
+                value,
+                time.time() if loaded_at is None else loaded_at,
+                stale_ttl,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> list[tuple[Hashable, Any, float, float]]:
+        """Entries that can still be served, oldest used first, for `restore`."""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, value, loaded_at, stale_ttl)
+                for key, (value, loaded_at, stale_ttl) in self._entries.items()
+                if now - loaded_at < stale_ttl
+            ]
+
+    def restore(self, entries: list[tuple[Hashable, Any, float, float]]) -> int:
+        """Add entries from `snapshot`, skipping expired ones and keys already cached.
+
+        Returns:
+            The number of restored entries.
+        """
+        now = time.time()
+        restored = 0
+        for key, value, loaded_at, stale_ttl in entries:
+            if now - loaded_at >= stale_ttl or key in self._entries:
+                continue
+            self.set(key, value, loaded_at, stale_ttl)
+            restored += 1
+        return restored
+
+    def _refresh(
+        self, key: Hashable, loader: Callable[[], Any], stale_ttl: float
+    ) -> None:
+        try:
+            self.set(key, loader(), stale_ttl=stale_ttl)
+        except Exception as e:
+            logger.warning("Background refresh of {} failed: {}", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: float,
+        stale_ttl: float | None = None,
+    ) -> Any:
+        """Return the cached value for `key`, loading or refreshing it as needed.
+
+        Args:
+            key: Cache key.
+            loader: Zero argument callable producing a fresh value.
+            ttl: Seconds a value is served without refreshing.
+            stale_ttl: Seconds a value may be served while refreshing, defaults
+                to ten times `ttl`.
+
+        Returns:
+            The cached or freshly loaded value.
+        """
+        stale_ttl = ttl * 10 if stale_ttl is None else stale_ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            value, loaded_at, _ = entry
+            age = time.time() - loaded_at
+            if age < ttl:
+                return value
+            if age < stale_ttl:
+                with self._lock:
+                    start_refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start_refresh:
+                    self._executor.submit(self._refresh, key, loader, stale_ttl)
+                return value
+
+        # Concurrent misses for the same key share a single load
+        with self._lock:
+            loading = self._loading.get(key)
+            if loading is None:
+                self._loading[key] = Future()
+
+        try:
+            if loading is not None:
+                return self._wait_for_load(key, loading)
+            value = self._load(key, loader, stale_ttl)
+        except Exception:
+            if entry is None:
+                raise
+            logger.warning("Serving stale {} after failed load", key)
+            return entry[0]
+        return value
+
+    @staticmethod
+    def _wait_for_load(key: Hashable, loading: Future) -> Any:
+        """Wait for another caller's load, no longer than the request's budget."""
+        deadline = request_deadline.get()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return loading.result(timeout)
+        except TimeoutError:
+            raise UpstreamUnavailableError(
+                f"{key}: request budget exhausted waiting for load"
+            ) from None
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], stale_ttl: float) -> Any:
+        future = self._loading[key]
+        try:
+            value = loader()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.set(key, value, stale_ttl=stale_ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+
+class DeadlineMiddleware:
+    """Set `request_deadline` from a per route latency budget (in seconds).
+
+    Routes without a budget get `default_budget`, or no deadline when it is None.
+    """
+
+    def __init__(
+        self, app, budgets: dict[str, float], default_budget: float | None = None
+    ):
+        self.app = app
+        self.budgets = budgets
+        self.default_budget = default_budget
+
+    async def __call__(self, scope, receive, send):
+        budget = (
+            self.budgets.get(scope["path"], self.default_budget)
+            if scope["type"] == "http"
+            else None
+        )
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = request_deadline.set(time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
@@ -0,0 +1,151 @@
+"""Periodic on-disk snapshots of in-process caches for warm restarts."""
+
+import os
+import pickle
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Protocol
+
+from loguru import logger
+
+SNAPSHOT_MAGIC = b"MGSNAP"
+# Private to the app's user, snapshots are unpickled so nobody else may write them
+DEFAULT_SNAPSHOT_PATH = (
+    Path(__file__).resolve().parents[2] / ".cache" / "snapshots" / "snapshot.bin"
+)
+# Bump when the layout of any snapshotted state changes, old snapshots are ignored
+SNAPSHOT_VERSION = 2
+
+
+def is_private(path: Path) -> bool:
+    """Whether `path` and its directory are owned by us and writable by no one else."""
+    if not hasattr(os, "getuid"):  # pragma: no cover - no ownership on Windows
+        return True
+    for stat in (path.stat(), path.parent.stat()):
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+            return False
+    return True
+
+
+class Snapshottable(Protocol):
+    def snapshot(self) -> Any: ...
+
+    def restore(self, state: Any) -> int: ...
+
+
+class SnapshotManager:
+    """Checkpoint named sources (caches, game pools) to a single snapshot file.
+
+    The file is a magic header and format version followed by a zlib compressed
+    pickle. It is written to a temporary file next to the target and atomically
+    renamed, so a crash mid-write never leaves a truncated snapshot behind. The
+    snapshot is unpickled, so it is kept in a directory only the app's user can
+    write and files that anyone else could have written are never loaded.
+
+    Args:
+        path: Snapshot file location.
+        sources: Objects with `snapshot` and `restore` methods, by name.
+        interval: Seconds between checkpoints, 0 disables the background thread.
+    """
+
+    def __init__(
+        self, path: str | Path, sources: dict[str, Snapshottable], interval: float = 300
+    ):
+        self.path = Path(path)
+        self.sources = sources
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def from_env(cls, sources: dict[str, Snapshottable]) -> "SnapshotManager":
+        return cls(
+            path=os.getenv("SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH),
+            sources=sources,
+            interval=float(os.getenv("SNAPSHOT_INTERVAL", "300")),
+        )
+
+    def save(self) -> None:
+        state = {name: source.snapshot() for name, source in self.sources.items()}
+        payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+        header = SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(2, "big")
+
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header + payload)
+                f.flush()
+                os.fsync(f.fileno())
+            Path(tmp_path).replace(self.path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        logger.info("Saved snapshot {} ({} bytes)", self.path, len(payload))
+
+    def load(self) -> dict[str, int]:
+        """Restore every source from the snapshot file, if there is a usable one.
+
+        Returns:
+            The number of restored entries per source name.
+        """
+        if not self.path.is_file():
+            return {}
+        if not is_private(self.path):
+            logger.warning("Ignoring snapshot {} writable by other users", self.path)
+            return {}
+
+        data = self.path.read_bytes()
+        header_size = len(SNAPSHOT_MAGIC) + 2
+        version = int.from_bytes(data[len(SNAPSHOT_MAGIC) : header_size], "big")
+        if not data.startswith(SNAPSHOT_MAGIC) or version != SNAPSHOT_VERSION:
+            logger.warning("Ignoring snapshot {} with unknown format", self.path)
+            return {}
+
+        try:
+            state = pickle.loads(zlib.decompress(data[header_size:]))
+        except Exception as e:
+            logger.warning("Ignoring unreadable snapshot {}: {}", self.path, e)
+            return {}
+
+        restored = {
+            name: source.restore(state[name])
+            for name, source in self.sources.items()
+            if name in state
+        }
+        logger.info("Restored snapshot {}: {}", self.path, restored)
+        return restored
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.warning("Saving snapshot failed: {}", e)
+
+    def start(self) -> None:
+        """Load the snapshot and start periodic checkpoints."""
+        try:
+            self.load()
+        except Exception as e:
+            logger.warning("Loading snapshot failed: {}", e)
+
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="snapshot", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop periodic checkpoints and write a final snapshot, never raising."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning("Saving final snapshot failed: {}", e)
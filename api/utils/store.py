@@ -0,0 +1,318 @@
+"""Redis helpers: an in-process stand-in and a cached TinyRedis store."""
+
+import fnmatch
+import os
+import threading
+from collections.abc import Callable, Iterable
+from copy import copy
+from dataclasses import asdict
+from json import dumps
+from typing import Any
+from uuid import uuid4
+
+import redis
+from loguru import logger
+from tinyredis import TinyRedis
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of the redis-py client used by the apps.
+
+    Values, hash fields and sorted set members are stored and returned as bytes
+    like the real client. Every direct command and every pipeline `execute`
+    counts as one round trip, which lets tests assert how chatty a code path is.
+
+    Examples:
+        >>> r = LocalRedis()
+        >>> r.set("a", 1)
+        True
+        >>> r.mget(["a", "b"])
+        [b'1', None]
+        >>> pipe = r.pipeline()
+        >>> pipe.incr("a").incr("a").execute()
+        [2, 3]
+        >>> r.round_trips
+        3
+        >>> r.zincrby("scores", 2, "bob")
+        2.0
+        >>> r.zrevrange("scores", 0, -1, withscores=True)
+        [(b'bob', 2.0)]
+    """
+
+    def __init__(self):
+        # Strings are bytes, hashes dict[bytes, bytes] and sorted sets dict[bytes, float]
+        self._data: dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self.round_trips = 0
+
+    def _run(self, commands: list[tuple[str, tuple, dict]]) -> list[Any]:
+        with self._lock:
+            self.round_trips += 1
+            return [
+                getattr(self, f"_{name}")(*args, **kwargs)
+                for name, args, kwargs in commands
+            ]
+
+    def _command(self, name: str, *args, **kwargs) -> Any:
+        return self._run([(name, args, kwargs)])[0]
+
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    def get(self, key: str) -> bytes | None:
+        return self._command("get", key)
+
+    def set(self, key: str, value: Any) -> bool:
+        return self._command("set", key, value)
+
+    def mget(self, keys: Iterable[str], *args: str) -> list[bytes | None]:
+        return self._command("mget", keys, *args)
+
+    def delete(self, *keys: str) -> int:
+        return self._command("delete", *keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self._command("incr", key, amount)
+
+    def scan_iter(self, match: str = "*", count: int | None = None):
+        yield from self._command("scan", match)
+
+    def hset(
+        self,
+        name: str,
+        key: str | None = None,
+        value: Any = None,
+        mapping: dict | None = None,
+    ) -> int:
+        return self._command("hset", name, key, value, mapping)
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        return self._command("hincrby", name, key, amount)
+
+    def hgetall(self, name: str) -> dict[bytes, bytes]:
+        return self._command("hgetall", name)
+
+    def zincrby(self, name: str, amount: float, value: Any) -> float:
+        return self._command("zincrby", name, amount, value)
+
+    def zrevrange(
+        self, name: str, start: int, end: int, withscores: bool = False
+    ) -> list:
+        return self._command("zrevrange", name, start, end, withscores)
+
+    def _get(self, key: str) -> bytes | None:
+        return self._data.get(key)
+
+    def _set(self, key: str, value: Any) -> bool:
+        self._data[key] = _encode(value)
+        return True
+
+    def _mget(self, keys: Iterable[str], *args: str) -> list[bytes | None]:
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return [self._data.get(key) for key in [*keys, *args]]
+
+    def _delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def _incr(self, key: str, amount: int = 1) -> int:
+        value = int(self._data.get(key, b"0")) + amount
+        self._data[key] = _encode(value)
+        return value
+
+    def _scan(self, match: str) -> list[str]:
+        return [key for key in self._data if fnmatch.fnmatchcase(key, match)]
+
+    def _hset(
+        self,
+        name: str,
+        key: str | None = None,
+        value: Any = None,
+        mapping: dict | None = None,
+    ) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        fields = self._data.setdefault(name, {})
+        added = sum(_encode(field) not in fields for field in items)
+        fields.update({_encode(field): _encode(v) for field, v in items.items()})
+        return added
+
+    def _hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        fields = self._data.setdefault(name, {})
+        value = int(fields.get(_encode(key), b"0")) + amount
+        fields[_encode(key)] = _encode(value)
+        return value
+
+    def _hgetall(self, name: str) -> dict[bytes, bytes]:
+        return dict(self._data.get(name, {}))
+
+    def _zincrby(self, name: str, amount: float, value: Any) -> float:
+        members = self._data.setdefault(name, {})
+        score = members.get(_encode(value), 0.0) + amount
+        members[_encode(value)] = score
+        return score
+
+    def _zrevrange(
+        self, name: str, start: int, end: int, withscores: bool = False
+    ) -> list:
+        members = sorted(
+            self._data.get(name, {}).items(), key=lambda item: (-item[1], item[0])
+        )
+        members = members[start : None if end == -1 else end + 1]
+        return members if withscores else [member for member, _ in members]
+
+
+class LocalPipeline:
+    """Buffers commands for `LocalRedis` and runs them as a single round trip."""
+
+    def __init__(self, redis: LocalRedis):
+        self._redis = redis
+        self._commands: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if not hasattr(self._redis, f"_{name}"):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self) -> list[Any]:
+        commands, self._commands = self._commands, []
+        return self._redis._run(commands) if commands else []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+
+def get_redis():
+    """Redis client for `VERCEL_KV_REDIS_URL`, or a `LocalRedis` when it is unset.
+
+    An invalid URL, like the placeholder of `.env.example`, also falls back to
+    `LocalRedis`, so importing an app never fails on it.
+    """
+    redis_url = os.getenv("VERCEL_KV_REDIS_URL")
+    if not redis_url:
+        logger.warning("VERCEL_KV_REDIS_URL is not set, using in-process LocalRedis")
+        return LocalRedis()
+    try:
+        return redis.from_url(redis_url)
+    except ValueError as e:
+        logger.warning(
+            "Invalid VERCEL_KV_REDIS_URL, using in-process LocalRedis: {}", e
+        )
+        return LocalRedis()
+
+
+class CachedTinyRedis(TinyRedis):
+    """TinyRedis with pipelined writes and a versioned read-through cache.
+
+    Every write goes out in a single pipeline together with an `INCR` of a version
+    key. Calling the store first reads that version (one round trip) and only
+    reloads every record when another writer has bumped it, so workers sharing
+    the same Redis never serve each other's stale lists.
+
+    Examples:
+        >>> from dataclasses import dataclass
+        >>> @dataclass
+        ... class Item:
+        ...     id: str = None
+        ...     priority: int = 0
+        >>> items = CachedTinyRedis(LocalRedis(), Item, sort_key=lambda o: o.priority)
+        >>> items.insert_all([Item("a", 2), Item("b", 1)])
+        (Item(id='a', priority=2), Item(id='b', priority=1))
+        >>> [o.id for o in items()]
+        ['b', 'a']
+    """
+
+    def __init__(
+        self,
+        r,
+        typ,
+        xtra: dict | None = None,
+        sort_key: Callable[[Any], Any] | None = None,
+    ):
+        super().__init__(r, typ, xtra or {})
+        self.sort_key = sort_key
+        self.version_key = f"version:{self.nm}"
+        self._cache: dict[str, Any] = {}
+        self._cache_version: int | None = None
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        return int(self.r.get(self.version_key) or 0)
+
+    def _load(self) -> dict[str, Any]:
+        keys = list(self.r.scan_iter(match=f"{self.nm}:*", count=10000))
+        if not keys:
+            return {}
+        objs = [self.to_obj(o) for o in self.r.mget(keys) if o is not None]
+        return {o.id: o for o in objs}
+
+    def _write(self, upserts: Iterable = (), deletes: Iterable[str] = ()) -> None:
+        upserts, deletes = list(upserts), list(deletes)
+        pipe = self.r.pipeline()
+        for o in upserts:
+            pipe.set(self.to_id(o.id), dumps(asdict(o)))
+        if deletes:
+            pipe.delete(*(self.to_id(id) for id in deletes))
+        pipe.incr(self.version_key)
+        version = pipe.execute()[-1]
+
+        with self._lock:
+            # Apply our own write locally when nobody else wrote in between,
+            # otherwise leave the cache stale so the next read reloads it.
+            if self._cache_version is not None and version == self._cache_version + 1:
+                self._cache.update({o.id: copy(o) for o in upserts})
+                for id in deletes:
+                    self._cache.pop(id, None)
+                self._cache_version = version
+
+    def __call__(self) -> list:
+        version = self.version()
+        with self._lock:
+            cached = self._cache if version == self._cache_version else None
+            items = [copy(o) for o in cached.values()] if cached is not None else None
+
+        if items is None:
+            loaded = self._load()
+            with self._lock:
+                self._cache, self._cache_version = loaded, version
+            items = [copy(o) for o in loaded.values()]
+
+        return sorted(items, key=self.sort_key) if self.sort_key else items
+
+    def insert(self, o=None, d=None, **kw):
+        d = self._xpand(d, o, kw)
+        if d.get("id", None) is None:
+            d["id"] = str(uuid4())
+        obj = self.typ(**d)
+        self._write(upserts=[obj])
+        return obj
+
+    def insert_all(self, objs):
+        self._write(upserts=objs)
+        return tuple(objs)
+
+    def update(self, o=None, d=None, **kw):
+        d = self._xpand(d, o, kw)
+        obj = self.typ(**{**self.get(d["id"]), **d})
+        self._write(upserts=[obj])
+        return obj
+
+    def delete(self, id):
+        self._write(deletes=[id])
+
+    def delete_all(self, ids: Iterable[str]) -> None:
+        self._write(deletes=ids)
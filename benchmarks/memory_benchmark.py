@@ -0,0 +1,176 @@
+"""Memory used per cached movie and per active game, before and after `api.utils.models`.
+
+Movies are generated offline in the shape of TMDB responses and parsed like
+tmdbv3api does, so no API key is needed. Run from the repository root with:
+
+    uv run python -m benchmarks.memory_benchmark
+"""
+
+import argparse
+import gc
+import json
+import random
+import string
+import tracemalloc
+from collections.abc import Callable
+
+from tmdbv3api.as_obj import AsObj
+
+from api.utils.models import GameState, MovieImages, MovieRecord
+
+BACKDROPS_PER_MOVIE = 20
+POSTERS_PER_MOVIE = 15
+
+
+def fake_path(rng: random.Random) -> str:
+    """A random path in TMDB's image path format."""
+    return (
+        "/" + "".join(rng.choices(string.ascii_letters + string.digits, k=27)) + ".jpg"
+    )
+
+
+def fake_image(rng: random.Random, width: int, height: int) -> dict:
+    """An entry of TMDB's image listing."""
+    return {
+        "aspect_ratio": round(width / height, 3),
+        "file_path": fake_path(rng),
+        "height": height,
+        "iso_639_1": rng.choice(["en", None]),
+        "vote_average": round(rng.uniform(0, 10), 3),
+        "vote_count": rng.randint(0, 50),
+        "width": width,
+    }
+
+
+def fake_tmdb_responses(count: int, seed: int = 0) -> list[tuple[str, str]]:
+    """JSON (movie, images) responses, parsed anew by every scenario."""
+    rng = random.Random(seed)
+    words = ["a", "lonely", "detective", "uncovers", "the", "truth", "about", "city"]
+    responses = []
+    for movie_id in range(count):
+        movie = {
+            "adult": False,
+            "backdrop_path": fake_path(rng),
+            "genre_ids": [18, 53],
+            "id": movie_id,
+            "original_language": "en",
+            "original_title": f"Movie {movie_id}",
+            "overview": " ".join(rng.choices(words, k=50)),
+            "popularity": rng.uniform(0, 500),
+            "poster_path": fake_path(rng),
+            "release_date": f"{rng.randint(1950, 2025)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "title": f"Movie {movie_id}",
+            "video": False,
+            "vote_average": rng.uniform(0, 10),
+            "vote_count": rng.randint(0, 10000),
+        }
+        images = {
+            "backdrops": [
+                fake_image(rng, 1920, 1080) for _ in range(BACKDROPS_PER_MOVIE)
+            ],
+            "posters": [fake_image(rng, 2000, 3000) for _ in range(POSTERS_PER_MOVIE)],
+        }
+        responses.append((json.dumps(movie), json.dumps(images)))
+    return responses
+
+
+def category_entry(movie_json: str, images_json: str) -> AsObj:
+    """A category page entry, as cached before."""
+    return AsObj(json.loads(movie_json))
+
+
+def category_record(movie_json: str, images_json: str) -> MovieRecord:
+    """A category page entry, as cached now."""
+    return MovieRecord.from_tmdb(AsObj(json.loads(movie_json)))
+
+
+def movie_dict(movie_json: str, images_json: str) -> dict:
+    """The dict `get_random_movie_with_details` used to return."""
+    movie, images = AsObj(json.loads(movie_json)), AsObj(json.loads(images_json))
+    return {
+        "id": movie.id,
+        "title": movie.title,
+        "backdrops": [img.file_path for img in images.backdrops],
+        "posters": [img.file_path for img in images.posters],
+        "overview": getattr(movie, "overview", "N/A"),
+        "release_date": getattr(movie, "release_date", "N/A"),
+    }
+
+
+def movie_record(movie_json: str, images_json: str) -> MovieRecord:
+    """A movie ready for a game, as `get_random_movie_with_details` returns now."""
+    movie, images = AsObj(json.loads(movie_json)), AsObj(json.loads(images_json))
+    return MovieRecord.from_tmdb(movie).with_images(MovieImages.from_tmdb(images))
+
+
+def game_dict(movie_json: str, images_json: str) -> dict:
+    """The session dict games used to be stored as."""
+    movie = movie_dict(movie_json, images_json)
+    images = movie["backdrops"][:5]
+    movie = {k: v for k, v in movie.items() if k != "posters"} | {"backdrops": images}
+    return {
+        "movie": movie,
+        "current_backdrop_index": 0,
+        "shown_backdrops": images[:1],
+        "guesses_remaining": 5,
+        "category": "popular",
+        "mode": "backdrops",
+    }
+
+
+def game_state(movie_json: str, images_json: str) -> GameState:
+    """An active game, as held by route handlers now."""
+    return GameState.new(movie_record(movie_json, images_json))
+
+
+def bytes_per_item(build: Callable[[str, str], object], responses) -> float:
+    """Traced memory kept alive per built item, parsing garbage excluded."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(*response) for response in responses]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / len(responses)
+
+
+def main() -> None:
+    """Print bytes per item before (dicts and `AsObj`) and after (slotted records)."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=2000)
+    args = parser.parse_args()
+
+    responses = fake_tmdb_responses(args.movies)
+    game = game_state(*responses[0])
+    rows = [
+        (
+            "category entry",
+            bytes_per_item(category_entry, responses),
+            bytes_per_item(category_record, responses),
+        ),
+        (
+            "game movie",
+            bytes_per_item(movie_dict, responses),
+            bytes_per_item(movie_record, responses),
+        ),
+        (
+            "active game",
+            bytes_per_item(game_dict, responses),
+            bytes_per_item(game_state, responses),
+        ),
+        (
+            "session cookie",
+            len(json.dumps(game_dict(*responses[0]))),
+            len(json.dumps(game.to_session())),
+        ),
+    ]
+
+    print(f"{'bytes per':<16}{'before':>10}{'slotted':>10}{'saved':>8}")  # noqa: T201
+    for name, before, after in rows:
+        print(f"{name:<16}{before:>10.0f}{after:>10.0f}{1 - after / before:>8.0%}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+
+from fasthtml.common import *
+
+from api.utils.admission import (
+    AdaptiveLimit,
+    AdmissionMiddleware,
+    ConcurrencyLimiter,
+    RoutePolicy,
+    is_overloaded,
+)
+
+
+def test_limit_grows_when_healthy_and_shrinks_when_slow():
+    limit = AdaptiveLimit(initial=4, max_limit=32)
+    for _ in range(20):
+        limit.update(latency=0.05, inflight=int(limit.limit))
+    healthy = limit.limit
+    assert healthy > 4
+
+    for _ in range(20):
+        limit.update(latency=0.5, inflight=int(limit.limit))
+    assert limit.limit < healthy / 2
+
+    limit.update(latency=0.05, inflight=1, failed=True)
+    assert limit.limit >= limit.min_limit
+
+
+def test_idle_route_does_not_grow():
+    limit = AdaptiveLimit(initial=8)
+    for _ in range(50):
+        limit.update(latency=0.05, inflight=1)
+    assert limit.limit == 8
+
+
+def test_waiters_are_admitted_by_priority():
+    async def scenario():
+        limiter = ConcurrencyLimiter(AdaptiveLimit(initial=1, max_limit=1))
+        assert await limiter.acquire()
+        order = []
+
+        async def wait(name, priority):
+            if await limiter.acquire(priority, max_wait=1.0):
+                order.append(name)
+                limiter.release(0.01)
+
+        waiters = [
+            asyncio.create_task(wait("search", 1)),
+            asyncio.create_task(wait("guess", 0)),
+        ]
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        await asyncio.gather(*waiters)
+        return order, limiter.inflight
+
+    assert asyncio.run(scenario()) == (["guess", "search"], 0)
+
+
+def test_raised_limit_admits_queued_waiters():
+    async def scenario():
+        limiter = ConcurrencyLimiter(AdaptiveLimit(initial=1, max_limit=8))
+        assert await limiter.acquire()
+        waiters = [
+            asyncio.create_task(limiter.acquire(max_wait=0.5)) for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        limiter.limit.limit = 8
+        assert await limiter.acquire()
+        return await asyncio.gather(*waiters), limiter.inflight, limiter.queued
+
+    assert asyncio.run(scenario()) == ([True, True, True], 5, 0)
+
+
+def test_cancelled_waiters_free_their_place_and_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter(AdaptiveLimit(initial=1, max_limit=1), max_queue=1)
+        assert await limiter.acquire()
+
+        # Cancelled while queued, the next request doesn't trip over its future
+        waiter = asyncio.create_task(limiter.acquire(1, max_wait=1.0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queued == 0
+
+        # Cancelled just after being handed the slot, which must not leak
+        waiter = asyncio.create_task(limiter.acquire(1, max_wait=1.0))
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return limiter.inflight, limiter.queued
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_cancelled_waiter_can_be_evicted():
+    async def scenario():
+        limiter = ConcurrencyLimiter(AdaptiveLimit(initial=1, max_limit=1), max_queue=1)
+        assert await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire(1, max_wait=1.0))
+        await asyncio.sleep(0)
+        # Cancelled, but its task hasn't run its cleanup yet
+        waiter.cancel()
+        guess = asyncio.create_task(limiter.acquire(0, max_wait=0.05))
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        results = await asyncio.gather(waiter, guess, return_exceptions=True)
+        return isinstance(results[0], asyncio.CancelledError), results[1]
+
+    assert asyncio.run(scenario()) == (True, True)
+
+
+def test_full_queue_evicts_lower_priority_and_times_out():
+    async def scenario():
+        limiter = ConcurrencyLimiter(AdaptiveLimit(initial=1, max_limit=1), max_queue=1)
+        assert await limiter.acquire()
+        search = asyncio.create_task(limiter.acquire(1, max_wait=1.0))
+        await asyncio.sleep(0)
+        guess = asyncio.create_task(limiter.acquire(0, max_wait=0.05))
+        results = await asyncio.gather(search, guess)
+        return results, limiter.queued, limiter.rejected
+
+    assert asyncio.run(scenario()) == ([False, False], 0, 2)
+
+
+def test_middleware_degrades_or_falls_back():
+    limiter = ConcurrencyLimiter(AdaptiveLimit(initial=1, max_limit=1))
+    limiter.inflight = 1  # Every slot is taken
+    app, rt = fast_app()
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiters={"tmdb": limiter},
+        routes={
+            "/search": RoutePolicy("tmdb", max_wait=0),
+            "/guess": RoutePolicy("tmdb", max_wait=0, fallback=Response("busy")),
+        },
+    )
+
+    @rt("/search")
+    def get(request):
+        return "cached" if is_overloaded(request) else "fresh"
+
+    @rt("/guess")
+    def post():
+        return "guessed"
+
+    client = Client(app)
+    assert client.get("/search").text == "cached"
+    assert client.post("/guess").text == "busy"
+
+    limiter.inflight = 0
+    assert client.get("/search").text == "fresh"
+    assert limiter.inflight == 0
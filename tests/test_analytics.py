@@ -0,0 +1,89 @@
+import pytest
+
+from api.utils.analytics import (
+    GAME_FAILED,
+    GAME_SOLVED,
+    GAME_STARTED,
+    GUESS_WRONG,
+    GameAnalytics,
+    GameEvent,
+)
+from api.utils.store import LocalRedis
+
+
+@pytest.fixture
+def redis():
+    return LocalRedis()
+
+
+@pytest.fixture
+def analytics(redis):
+    return GameAnalytics(redis, capacity=100, interval=0)
+
+
+def play(analytics, player, movie_id, kinds):
+    analytics.record(GameEvent(GAME_STARTED, player, movie_id, title=f"Movie {movie_id}"))
+    for guesses_used, kind in enumerate(kinds, start=1):
+        analytics.record(GameEvent(kind, player, movie_id, guesses_used))
+
+
+def test_record_does_no_io_and_flush_batches(redis, analytics):
+    for _ in range(20):
+        play(analytics, "alice", 1, [GUESS_WRONG, GAME_SOLVED])
+    assert redis.round_trips == 0
+
+    assert analytics.flush() == 60
+    # One write pipeline and two leaderboard reads
+    assert redis.round_trips == 3
+    assert redis.hgetall("analytics:totals")[b"solved_in:2"] == b"20"
+
+
+def test_leaderboard_and_movie_stats(analytics):
+    play(analytics, "alice", 1, [GAME_SOLVED])
+    play(analytics, "bob", 1, [GUESS_WRONG, GUESS_WRONG, GAME_SOLVED])
+    play(analytics, "bob", 2, [GUESS_WRONG] * 4 + [GAME_FAILED])
+    analytics.flush()
+
+    board = analytics.leaderboard
+    assert board.players == [("alice", 5), ("bob", 3)]
+    assert [stats.movie_id for stats in board.movies] == [1, 2]
+    assert board.movies[0].title == "Movie 1"
+    assert board.movies[0].solve_rate == 1.0
+    assert (board.games, board.solved) == (3, 2)
+    assert board.guesses_to_solve == {1: 1, 3: 1}
+
+    stats = analytics.movie_stats(2)
+    assert (stats.played, stats.failed, stats.solve_rate) == (1, 1, 0.0)
+
+
+def test_full_buffer_drops_oldest_events(analytics):
+    for _ in range(150):
+        analytics.record(GameEvent(GAME_STARTED, "alice", 1))
+    assert analytics.dropped == 50
+    assert analytics.flush() == 100
+
+
+def test_failed_flush_keeps_aggregates(redis, analytics, monkeypatch):
+    play(analytics, "alice", 1, [GAME_SOLVED])
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(redis, "_run", unavailable)
+    with pytest.raises(ConnectionError):
+        analytics.flush()
+    monkeypatch.undo()
+
+    play(analytics, "alice", 1, [GAME_SOLVED])
+    analytics.flush()
+    assert analytics.leaderboard.players == [("alice", 10)]
+
+
+def test_stop_survives_unavailable_store(redis, analytics, monkeypatch):
+    play(analytics, "alice", 1, [GAME_SOLVED])
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(redis, "_run", unavailable)
+    analytics.stop()
@@ -0,0 +1,104 @@
+import gzip
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from api.utils.compression import (
+    CompressionMiddleware,
+    PrecompressedStaticMiddleware,
+    precompress_directory,
+)
+
+BODY = "movie " * 200
+
+
+async def stream_chunks():
+    for _ in range(3):
+        yield BODY
+
+
+def make_client(app) -> TestClient:
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def make_app() -> Starlette:
+    return Starlette(
+        routes=[
+            Route("/large", lambda request: PlainTextResponse(BODY)),
+            Route("/small", lambda request: PlainTextResponse("tiny")),
+            Route(
+                "/stream",
+                lambda request: StreamingResponse(stream_chunks(), media_type="text/plain"),
+            ),
+            Route(
+                "/events",
+                lambda request: StreamingResponse(
+                    stream_chunks(), media_type="text/event-stream"
+                ),
+            ),
+        ]
+    )
+
+
+def test_compresses_large_responses():
+    client = make_client(make_app())
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.text == BODY
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_small_and_event_stream_responses_are_not_compressed():
+    client = make_client(make_app())
+    headers = {"Accept-Encoding": "gzip"}
+
+    assert "content-encoding" not in client.get("/small", headers=headers).headers
+    response = client.get("/events", headers=headers)
+    assert "content-encoding" not in response.headers
+    assert response.text == BODY * 3
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk():
+    client = make_client(make_app())
+
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == BODY * 3
+
+
+def test_precompressed_static_files(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "game.css").write_text(".guess { color: red; }\n" * 100)
+    (tmp_path / "tiny.txt").write_text("tiny")
+
+    written = precompress_directory(tmp_path)
+    assert tmp_path / "css" / "game.css.gz" in written
+    assert not (tmp_path / "tiny.txt.gz").exists()
+
+    app = Starlette()
+    app.add_middleware(PrecompressedStaticMiddleware, directory=tmp_path)
+    client = make_client(app)
+
+    response = client.get("/css/game.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/css")
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == (tmp_path / "css" / "game.css").read_bytes()
+
+    response = client.get("/css/game.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert gzip.decompress((tmp_path / "css" / "game.css.gz").read_bytes()) == (
+        response.content
+    )
+
+    assert client.get("/css/game.css.gz").status_code == 404
+    assert client.get("/../secret").status_code == 404
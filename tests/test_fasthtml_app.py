@@ -0,0 +1,77 @@
+from fasthtml.common import *
+from api.gui.fasthtml_app import app
+import pytest
+
+@pytest.fixture
+def client():
+    return Client(app)
+
+def test_get_search_not_modified(client, monkeypatch):
+    results = [
+        {
+            "title": "The Matrix",
+            "similarity": 100,
+            "id": 603,
+            "release_date": "1999-03-30",
+            "overview": "N/A",
+            "backdrop_image_url": "N/A",
+        }
+    ]
+    monkeypatch.setattr(
+        "api.gui.fasthtml_app.fuzzy_search_movies", lambda **kwargs: results
+    )
+
+    response = client.get("/search", params={"query": "Matrix", "limit": 50})
+    assert response.status_code == 200
+    assert "The Matrix" in response.text
+    assert "max-age" in response.headers["cache-control"]
+
+    etag = response.headers["etag"]
+    response = client.get(
+        "/search",
+        params={"query": "Matrix", "limit": 50},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+RESULTS = [
+    {
+        "title": f"Movie {i}",
+        "similarity": 90,
+        "id": i,
+        "release_date": "2000-01-01",
+        "overview": "N/A",
+        "backdrop_image_url": "N/A",
+    }
+    for i in range(3)
+]
+
+def test_search_sends_cards_before_backdrops(client, monkeypatch):
+    calls = []
+
+    def fake_search(query, limit, include_backdrops):
+        calls.append(include_backdrops)
+        return RESULTS
+
+    monkeypatch.setattr("api.gui.fasthtml_app.fuzzy_search_movies", fake_search)
+
+    response = client.get("/search", params={"query": "Movie"})
+    assert calls == [False]
+    assert 'sse-swap="backdrop-2"' in response.text
+    assert "/search/backdrops?query=movie&amp;limit=5" in response.text
+
+def test_backdrop_stream(client, monkeypatch):
+    monkeypatch.setattr(
+        "api.gui.fasthtml_app.fuzzy_search_movies", lambda **kwargs: RESULTS
+    )
+    monkeypatch.setattr(
+        "api.gui.fasthtml_app.get_backdrop_image_url",
+        lambda movie_id: f"https://image.tmdb.org/t/p/w500/{movie_id}.jpg",
+    )
+
+    response = client.get("/search/backdrops", params={"query": "Movie"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    for i in range(3):
+        assert f"event: backdrop-{i}\ndata: " in response.text
+        assert f"/{i}.jpg" in response.text
+    assert response.text.rstrip().endswith("event: done\ndata: <div></div>")
@@ -1,9 +1,22 @@
+import time
+from dataclasses import replace
+
 from fasthtml.common import *
-from api.gui.game_app import app
+from api.gui.game_app import app, game_pool, profile_store, profiling_config
+from api.utils.analytics import GameAnalytics
+from api.utils.models import MovieRecord
+from api.utils.profiling import sign_profile_token
+from api.utils.store import LocalRedis
 import pytest
 
 @pytest.fixture
-def client():
+def client(monkeypatch):
+    # Load games synchronously so monkeypatched TMDB helpers are used
+    monkeypatch.setattr(game_pool, "size", 0)
+    game_pool.clear()
+    monkeypatch.setattr(
+        "api.gui.game_app.analytics", GameAnalytics(LocalRedis(), interval=0)
+    )
     return Client(app)
 
 def test_main_page_loads(client):
@@ -51,3 +64,177 @@ def test_no_guess_provided(client):
 #     assert response.status_code == 200
 #     assert "Wrong guess" in response.text
 #     assert "backdrop-container" in response.text  # Should show next backdrop
+
+FAKE_RESULTS = [
+    {
+        "title": "The Matrix",
+        "similarity": 100,
+        "id": 603,
+        "release_date": "1999-03-30",
+        "overview": "N/A",
+        "backdrop_image_url": "N/A",
+    }
+]
+
+def test_get_search_is_cacheable(client, monkeypatch):
+    queries = []
+
+    def fake_search(query, limit, include_backdrops):
+        queries.append((query, limit))
+        return FAKE_RESULTS
+
+    monkeypatch.setattr("api.gui.game_app.fuzzy_search_movies", fake_search)
+
+    response = client.get("/search", params={"query": "  The   MATRIX "})
+    assert response.status_code == 200
+    assert "The Matrix" in response.text
+    assert response.headers["etag"].startswith('W/"')
+    assert "public" in response.headers["cache-control"]
+    assert "stale-while-revalidate" in response.headers["cache-control"]
+    assert "set-cookie" not in response.headers
+    assert queries == [("the matrix", 3)]
+
+    other = client.get("/search", params={"query": "the matrix"})
+    assert other.headers["etag"] == response.headers["etag"]
+
+def test_get_search_not_modified(client, monkeypatch):
+    monkeypatch.setattr(
+        "api.gui.game_app.fuzzy_search_movies", lambda **kwargs: FAKE_RESULTS
+    )
+
+    etag = client.get("/search", params={"query": "Matrix"}).headers["etag"]
+    response = client.get(
+        "/search", params={"query": "Matrix"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.text == ""
+
+def test_profile_admin_requires_token(client):
+    assert client.get("/admin/profiles").status_code == 404
+
+
+def test_profile_admin_links_carry_header_token(client, monkeypatch):
+    monkeypatch.setattr(profiling_config, "secret", "secret")
+    monkeypatch.setattr(profile_store, "names", lambda: ["1-get-search.collapsed"])
+    token = sign_profile_token("secret")
+
+    response = client.get("/admin/profiles", headers={"X-Profile": token})
+    assert response.status_code == 200
+    assert f"/admin/profiles/1-get-search.collapsed?token={token}" in response.text
+
+FAKE_MOVIE = MovieRecord(
+    id=603,
+    title="The Matrix",
+    release_date="1999-03-30",
+    backdrops=("first", "second"),
+)
+
+def test_new_game_renders_page(client, monkeypatch):
+    monkeypatch.setattr(
+        "api.gui.game_app.get_random_movie_with_details", lambda **kwargs: FAKE_MOVIE
+    )
+
+    response = client.post("/new-game", data={"category": "top_rated"})
+    assert response.status_code == 200
+    assert "/first.jpg" in response.text
+    assert "search-form" in response.text
+
+def test_search_unavailable_is_not_cached(client, monkeypatch):
+    from api.utils.resilience import UpstreamUnavailableError
+
+    def unavailable(**kwargs):
+        raise UpstreamUnavailableError("search: circuit is open")
+
+    monkeypatch.setattr("api.gui.game_app.fuzzy_search_movies", unavailable)
+
+    response = client.get("/search", params={"query": "Matrix"})
+    assert response.status_code == 200
+    assert "temporarily unavailable" in response.text
+    assert "cache-control" not in response.headers
+
+def test_poster_game_mode(client, monkeypatch):
+    movie = replace(FAKE_MOVIE, posters=("poster1", "poster2"))
+    calls = []
+
+    def fake_details(**kwargs):
+        calls.append(kwargs)
+        return movie
+
+    monkeypatch.setattr("api.gui.game_app.get_random_movie_with_details", fake_details)
+    monkeypatch.setattr(
+        "api.gui.game_app.fuzzy_search_movies",
+        lambda **kwargs: [{**FAKE_RESULTS[0], "id": 1, "title": "Wrong"}],
+    )
+
+    response = client.post("/new-game", data={"mode": "posters"})
+    assert calls[0]["image_type"] == "posters"
+    assert "/poster1.jpg" in response.text
+    assert "posters-img" in response.text
+
+    response = client.post("/guess", data={"query": "Wrong"})
+    assert "/poster2.jpg" in response.text
+
+def test_guess_game_over_after_last_image(client, monkeypatch):
+    monkeypatch.setattr(
+        "api.gui.game_app.get_random_movie_with_details", lambda **kwargs: FAKE_MOVIE
+    )
+    monkeypatch.setattr(
+        "api.gui.game_app.fuzzy_search_movies",
+        lambda **kwargs: [{**FAKE_RESULTS[0], "id": 1, "title": "Wrong"}],
+    )
+
+    client.post("/new-game")
+    assert "/second.jpg" in client.post("/guess", data={"query": "Wrong"}).text
+
+    response = client.post("/guess", data={"query": "Wrong"})
+    assert "Game Over!" in response.text
+    assert "Guesses remaining: 3" in response.text
+
+def test_guesses_are_counted_on_the_leaderboard(client, monkeypatch):
+    from api.gui.game_app import analytics
+
+    monkeypatch.setattr(
+        "api.gui.game_app.get_random_movie_with_details", lambda **kwargs: FAKE_MOVIE
+    )
+    monkeypatch.setattr(
+        "api.gui.game_app.fuzzy_search_movies", lambda **kwargs: FAKE_RESULTS
+    )
+
+    client.post("/new-game")
+    assert "Correct!" in client.post("/guess", data={"query": "The Matrix"}).text
+    # The finished game can't be solved (and counted) twice
+    assert "Correct!" not in client.post("/guess", data={"query": "The Matrix"}).text
+
+    analytics.flush()
+    response = client.get("/leaderboard")
+    assert "1 of 1 games solved" in response.text
+    assert "The Matrix" in response.text
+    assert "1 guess: 1" in response.text
+
+def test_overloaded_routes_use_fallbacks(client, monkeypatch):
+    from api.gui.game_app import ADMISSION_ROUTES, admission_limiters
+
+    for limiter in admission_limiters.values():
+        monkeypatch.setattr(limiter, "inflight", 100)
+    for path, policy in ADMISSION_ROUTES.items():
+        monkeypatch.setitem(ADMISSION_ROUTES, path, replace(policy, max_wait=0))
+
+    def unexpected(**kwargs):
+        raise AssertionError("TMDB must not be called when overloaded")
+
+    monkeypatch.setattr("api.gui.game_app.fuzzy_search_movies", unexpected)
+    monkeypatch.setattr("api.gui.game_app.get_random_movie_with_details", unexpected)
+
+    response = client.get("/search", params={"query": "Matrix"})
+    assert "Search is busy" in response.text
+    assert "cache-control" not in response.headers
+    assert "Too many guesses" in client.post("/guess", data={"query": "Matrix"}).text
+    assert "temporarily unavailable" in client.post("/new-game").text
+
+    # A prepared game is served, the pool is refilled in the background
+    monkeypatch.setattr(game_pool, "size", 1)
+    game_pool.restore({("popular", "backdrops"): [(time.time(), FAKE_MOVIE)]})
+    monkeypatch.setattr(
+        "api.gui.game_app.get_random_movie_with_details", lambda **kwargs: FAKE_MOVIE
+    )
+    assert "/first.jpg" in client.post("/new-game").text
@@ -0,0 +1,73 @@
+import json
+
+from loguru import logger
+
+from api.utils.logger import CallSiteFilter, load_log_config, setup_logging
+
+
+def make_record(name="api.utils.movie", function="fuzzy_search_movies", level="INFO"):
+    return {"name": name, "function": function, "line": 1, "level": logger.level(level)}
+
+
+def test_filter_level():
+    log_filter = CallSiteFilter(level="WARNING")
+    assert not log_filter(make_record(level="INFO"))
+    assert log_filter(make_record(level="ERROR"))
+
+
+def test_filter_sampling_prefers_function_key():
+    log_filter = CallSiteFilter(
+        sample_rates={"api.utils.movie": 1.0, "api.utils.movie:fuzzy_search_movies": 0.0}
+    )
+    assert not log_filter(make_record())
+    assert log_filter(make_record(function="get_random_movie"))
+
+
+def test_filter_rate_limit():
+    log_filter = CallSiteFilter(rate_limits={"api.utils.movie": 0.001}, burst=3)
+    assert [log_filter(make_record()) for _ in range(5)] == [True] * 3 + [False] * 2
+    assert log_filter(make_record(function="get_random_movie"))
+
+
+def test_load_log_config(tmp_path, monkeypatch):
+    config_path = tmp_path / "log_config.json"
+    config_path.write_text(json.dumps({"level": "DEBUG", "serialize": True}))
+    monkeypatch.setenv("LOG_LEVEL", "ERROR")
+
+    config = load_log_config(config_path)
+    assert config["level"] == "ERROR"
+    assert config["serialize"] is True
+    assert config["enqueue"] is True
+
+
+def test_setup_logging_writes_json(tmp_path):
+    log_path = tmp_path / "app.log"
+    config_path = tmp_path / "log_config.json"
+    config_path.write_text(json.dumps({"sink": str(log_path), "serialize": True}))
+
+    handler_id = setup_logging(config_path)
+    logger.info("hello {}", "world")
+    logger.complete()
+    logger.remove(handler_id)
+
+    record = json.loads(log_path.read_text().splitlines()[-1])["record"]
+    assert record["message"] == "hello world"
+
+
+def test_setup_logging_skips_filter_below_level(tmp_path, monkeypatch):
+    config_path = tmp_path / "log_config.json"
+    config_path.write_text(
+        json.dumps({"sink": str(tmp_path / "app.log"), "level": "INFO"})
+    )
+    calls = []
+    monkeypatch.setattr(
+        CallSiteFilter, "__call__", lambda self, record: calls.append(record) or True
+    )
+
+    handler_id = setup_logging(config_path)
+    logger.debug("dropped {}", "early")
+    logger.info("kept")
+    logger.complete()
+    logger.remove(handler_id)
+
+    assert [record["message"] for record in calls] == ["kept"]
@@ -0,0 +1,53 @@
+import pickle
+from types import SimpleNamespace
+
+from api.utils.models import (
+    NOT_AVAILABLE,
+    GameState,
+    MovieImages,
+    MovieRecord,
+    decode_image_path,
+    encode_image_path,
+)
+
+
+def test_image_paths_round_trip():
+    path = "/kXfqcdQKsToO0OUXHcrrNCHDBzO.jpg"
+    assert encode_image_path(path) == "kXfqcdQKsToO0OUXHcrrNCHDBzO"
+    assert decode_image_path(encode_image_path(path)) == path
+    assert decode_image_path(encode_image_path("/odd-name.webp")) == "/odd-name.webp"
+
+
+def test_movie_from_tmdb_with_images():
+    result = SimpleNamespace(id=550, title="Fight Club", release_date="1999-10-15")
+    images = MovieImages.from_tmdb(
+        SimpleNamespace(
+            posters=[SimpleNamespace(file_path="/p1.jpg")],
+            backdrops=[SimpleNamespace(file_path="/b1.jpg"), SimpleNamespace(file_path="/b2.jpg")],
+        )
+    )
+
+    movie = MovieRecord.from_tmdb(result).with_images(images)
+    assert movie.overview is NOT_AVAILABLE
+    assert movie.backdrops == ("b1", "b2")
+    assert movie.image_paths("posters") == ["/p1.jpg"]
+    assert pickle.loads(pickle.dumps(movie)) == movie
+
+
+def test_game_state_session_round_trip():
+    movie = MovieRecord(550, "Fight Club", backdrops=tuple("abcdefg"), posters=("p",))
+    game = GameState.new(movie, category="upcoming")
+    assert game.movie.backdrops == tuple("abcde")
+
+    assert game.next_image() == "/b.jpg"
+    game.guesses_remaining = 0
+    assert game.next_image() is None
+
+    restored = GameState.from_session(game.to_session())
+    assert restored == game
+    assert restored.image_path == "/b.jpg"
+
+
+def test_outdated_session_starts_new_game():
+    assert GameState.from_session(None) is None
+    assert GameState.from_session({"movie": {"id": 550}, "guesses_remaining": 5}) is None
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api.utils import movie
+from api.utils.resilience import CircuitBreaker
+
+
+def make_image(path, width=1280, height=720):
+    return SimpleNamespace(
+        file_path=path, width=width, height=height, iso_639_1="en", vote_average=5.0, vote_count=3
+    )
+
+
+@pytest.fixture
+def images_calls(monkeypatch):
+    calls = []
+
+    def fake_images(movie_id, include_image_language):
+        calls.append(movie_id)
+        return SimpleNamespace(
+            posters=[make_image("/poster.jpg", 500, 750)],
+            backdrops=[make_image("/backdrop1.jpg"), make_image("/backdrop2.jpg")],
+        )
+
+    movie.tmdb_cache.clear()
+    monkeypatch.setattr(movie.tmdb_caller, "breaker", CircuitBreaker())
+    monkeypatch.setattr(movie.movie_api, "images", fake_images)
+    yield calls
+    movie.tmdb_cache.clear()
+
+
+def test_posters_and_backdrops_share_one_fetch(images_calls):
+    assert movie.get_movie_backdrops(550) == ["/backdrop1.jpg", "/backdrop2.jpg"]
+    assert movie.get_movie_posters(550) == ["/poster.jpg"]
+    assert images_calls == [550]
+
+    images = movie.get_movie_images(550)
+    assert images.posters[0].height == 750
+    assert images.backdrops[0].language == "en"
+
+
+def test_random_movie_with_posters(images_calls, monkeypatch):
+    popular = [SimpleNamespace(id=550, title="Fight Club", overview="", release_date="1999")]
+    monkeypatch.setitem(movie.MOVIE_CATEGORIES, "popular", lambda: popular)
+
+    details = movie.get_random_movie_with_details(min_images=1, image_type="posters")
+    assert details.title == "Fight Club"
+    assert details.image_paths("posters") == ["/poster.jpg"]
+    assert details.image_paths("backdrops") == ["/backdrop1.jpg", "/backdrop2.jpg"]
+    assert images_calls == [550]
+
+
+def test_poster_games_prefer_textless_posters(images_calls, monkeypatch):
+    def fake_images(movie_id, include_image_language):
+        titled = [make_image(f"/titled{i}.jpg", 500, 750) for i in range(2)]
+        textless = [
+            SimpleNamespace(**{**vars(make_image(f"/textless{movie_id}.jpg")), "iso_639_1": None})
+        ]
+        return SimpleNamespace(posters=titled + textless if movie_id == 2 else titled, backdrops=[])
+
+    movies = iter([SimpleNamespace(id=1, title="Titled"), SimpleNamespace(id=2, title="Textless")])
+    monkeypatch.setattr(movie, "get_random_movie", lambda category: movie.MovieRecord.from_tmdb(next(movies)))
+    monkeypatch.setattr(movie.movie_api, "images", fake_images)
+
+    details = movie.get_random_movie_with_details(min_images=1, image_type="posters")
+    assert details.title == "Textless"
+    assert details.image_paths("posters") == ["/textless2.jpg", "/titled0.jpg", "/titled1.jpg"]
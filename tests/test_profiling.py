@@ -0,0 +1,83 @@
+import threading
+import time
+
+from fasthtml.common import *
+import pytest
+
+from api.utils.profiling import (
+    ProfileStore,
+    ProfilingConfig,
+    ProfilingMiddleware,
+    sign_profile_token,
+    verify_profile_token,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(tmp_path, max_profiles=3)
+
+
+def make_client(config, store):
+    app, rt = fast_app()
+    app.add_middleware(ProfilingMiddleware, config=config, store=store)
+
+    @rt("/slow")
+    def get():
+        time.sleep(0.05)
+        return P("done")
+
+    return Client(app)
+
+
+def test_expired_token_is_rejected():
+    assert verify_profile_token("secret", sign_profile_token("secret"))
+    assert not verify_profile_token("secret", sign_profile_token("secret", ttl=-10))
+    assert not verify_profile_token(None, sign_profile_token("secret"))
+
+
+def test_store_is_bounded(store):
+    names = [store.save("GET", "/search", "main 1") for _ in range(5)]
+    assert store.names() == names[::-1][:3]
+    assert store.path("../secret") is None
+
+
+def test_every_nth_request_is_profiled(store):
+    client = make_client(ProfilingConfig(enabled=True, every_n=2), store)
+    for _ in range(4):
+        assert client.get("/slow").status_code == 200
+    assert len(store.names()) == 2
+
+    profile = store.path(store.names()[0]).read_text()
+    assert "get (test_profiling.py)" in profile
+
+
+def busy_background_thread(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_only_samples_request_threads(store):
+    client = make_client(ProfilingConfig(enabled=True, every_n=1), store)
+    stop = threading.Event()
+    background = threading.Thread(target=busy_background_thread, args=(stop,))
+    background.start()
+    try:
+        assert client.get("/slow").status_code == 200
+    finally:
+        stop.set()
+        background.join()
+
+    profile = store.path(store.names()[0]).read_text()
+    assert "get (test_profiling.py)" in profile
+    assert "busy_background_thread" not in profile
+    assert "MainThread" not in profile
+
+
+def test_signed_header_is_profiled(store):
+    client = make_client(ProfilingConfig(secret="secret"), store)
+    client.get("/slow", headers={"X-Profile": "bogus"})
+    assert store.names() == []
+
+    client.get("/slow", headers={"X-Profile": sign_profile_token("secret")})
+    assert len(store.names()) == 1
@@ -0,0 +1,186 @@
+import threading
+import time
+
+from fasthtml.common import *
+import pytest
+import requests
+
+from api.utils.resilience import (
+    CircuitBreaker,
+    DeadlineMiddleware,
+    ResilientCaller,
+    StaleCache,
+    UpstreamUnavailableError,
+    request_deadline,
+)
+
+
+def failing_loader():
+    raise UpstreamUnavailableError("down")
+
+
+def test_stale_cache_serves_stale_while_refreshing():
+    cache = StaleCache()
+    cache.set("key", "old", loaded_at=time.time() - 60)
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return "new"
+
+    assert cache.get_or_load("key", loader, ttl=10) == "old"
+    assert refreshed.wait(1)
+    time.sleep(0.05)
+    assert cache.get_or_load("key", loader, ttl=10) == "new"
+
+
+def test_stale_cache_serves_expired_value_on_failure():
+    cache = StaleCache()
+    cache.set("key", "old", loaded_at=time.time() - 1000)
+    assert cache.get_or_load("key", failing_loader, ttl=10, stale_ttl=100) == "old"
+
+    with pytest.raises(UpstreamUnavailableError):
+        cache.get_or_load("missing", failing_loader, ttl=10)
+
+
+def test_stale_cache_is_bounded():
+    cache = StaleCache(maxsize=2)
+    for key in range(3):
+        cache.get_or_load(key, lambda: "value", ttl=10)
+    assert len(cache) == 2
+
+
+def test_stale_cache_waiters_respect_their_budget():
+    cache = StaleCache()
+    release = threading.Event()
+
+    def slow_loader():
+        release.wait(1)
+        return "value"
+
+    leader = threading.Thread(
+        target=cache.get_or_load, args=("key", slow_loader), kwargs={"ttl": 10}
+    )
+    leader.start()
+    time.sleep(0.02)
+
+    token = request_deadline.set(time.monotonic() + 0.05)
+    start = time.monotonic()
+    try:
+        with pytest.raises(UpstreamUnavailableError, match="budget"):
+            cache.get_or_load("key", slow_loader, ttl=10)
+    finally:
+        request_deadline.reset(token)
+    assert time.monotonic() - start < 0.5
+
+    release.set()
+    leader.join()
+    assert cache.get_or_load("key", slow_loader, ttl=10) == "value"
+
+
+def test_caller_enforces_deadline():
+    caller = ResilientCaller(max_timeout=0.05)
+    start = time.monotonic()
+    with pytest.raises(UpstreamUnavailableError, match="deadline"):
+        caller("slow", lambda: time.sleep(1))
+    assert time.monotonic() - start < 0.5
+
+
+def test_caller_hedges_slow_calls():
+    caller = ResilientCaller(max_timeout=1.0)
+    for _ in range(20):
+        caller("op", lambda: "fast")
+
+    calls = []
+
+    def first_slow():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "hedged"
+
+    assert caller("op", first_slow) == "hedged"
+    assert len(calls) == 2
+
+
+def test_circuit_opens_after_failures():
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=2))
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError):
+            caller("op", failing_loader)
+
+    with pytest.raises(UpstreamUnavailableError, match="circuit is open"):
+        caller("op", lambda: "ok")
+
+
+def test_exhausted_budget_does_not_block_half_open_circuit():
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    with pytest.raises(UpstreamUnavailableError):
+        caller("op", failing_loader)
+
+    token = request_deadline.set(time.monotonic() - 1)
+    try:
+        with pytest.raises(UpstreamUnavailableError, match="budget exhausted"):
+            caller("op", lambda: "ok")
+    finally:
+        request_deadline.reset(token)
+    assert caller("op", lambda: "ok") == "ok"
+
+
+def test_request_budget_timeout_is_not_an_upstream_failure():
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1), max_timeout=5.0)
+    token = request_deadline.set(time.monotonic() + 0.05)
+    try:
+        with pytest.raises(UpstreamUnavailableError, match="deadline"):
+            caller("slow", lambda: time.sleep(0.5))
+    finally:
+        request_deadline.reset(token)
+    assert not caller.breaker.is_open
+
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1), max_timeout=0.05)
+    with pytest.raises(UpstreamUnavailableError, match="deadline"):
+        caller("slow", lambda: time.sleep(0.5))
+    assert caller.breaker.is_open
+
+
+def test_client_errors_are_raised_unchanged_and_keep_circuit_closed():
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1))
+
+    def unknown_movie():
+        raise ValueError("The resource you requested could not be found.")
+
+    for _ in range(3):
+        with pytest.raises(ValueError, match="could not be found"):
+            caller("op", unknown_movie)
+    assert not caller.breaker.is_open
+
+
+def test_server_errors_count_against_circuit():
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1))
+    response = requests.Response()
+    response.status_code = 503
+
+    def server_error():
+        raise requests.HTTPError("503 Server Error", response=response)
+
+    with pytest.raises(UpstreamUnavailableError, match="503"):
+        caller("op", server_error)
+    assert caller.breaker.is_open
+
+
+def test_deadline_middleware_sets_budget():
+    app, rt = fast_app()
+    app.add_middleware(DeadlineMiddleware, budgets={"/budget": 2.0})
+
+    @rt("/budget")
+    def get():
+        return str(round(request_deadline.get() - time.monotonic()))
+
+    @rt("/none")
+    def get():
+        return str(request_deadline.get())
+
+    client = Client(app)
+    assert client.get("/budget").text == "2"
+    assert client.get("/none").text == "None"
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from api.utils.game_pool import GamePool
+from api.utils.resilience import StaleCache
+from api.utils.snapshot import SNAPSHOT_MAGIC, SnapshotManager
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return tmp_path / "snapshots" / "snapshot.bin"
+
+
+def make_sources():
+    return {
+        "cache": StaleCache(),
+        "pool": GamePool(lambda key: {"id": 1}, size=2, max_age=60),
+    }
+
+
+def test_snapshot_round_trip(snapshot_path):
+    sources = make_sources()
+    sources["cache"].set(("images", 550), ["/a.jpg"], stale_ttl=100)
+    sources["cache"].set(("images", 551), ["/b.jpg"], loaded_at=time.time() - 200, stale_ttl=100)
+    sources["pool"].restore({("popular", "backdrops"): [(time.time(), {"id": 550})]})
+    SnapshotManager(snapshot_path, sources).save()
+    assert [p.name for p in snapshot_path.parent.iterdir()] == ["snapshot.bin"]
+
+    restored_sources = make_sources()
+    restored = SnapshotManager(snapshot_path, restored_sources).load()
+    assert restored == {"cache": 1, "pool": 1}
+    assert restored_sources["cache"].get_or_load(("images", 550), list, ttl=100) == ["/a.jpg"]
+    assert restored_sources["pool"].take(("popular", "backdrops")) == {"id": 550}
+
+
+def test_expired_pool_entries_are_dropped(snapshot_path):
+    sources = make_sources()
+    sources["pool"].restore({("popular", "backdrops"): [(time.time(), {"id": 550})]})
+    SnapshotManager(snapshot_path, sources).save()
+
+    restored_sources = make_sources()
+    restored_sources["pool"].max_age = 0
+    assert SnapshotManager(snapshot_path, restored_sources).load()["pool"] == 0
+
+
+def test_unknown_version_is_ignored(snapshot_path):
+    snapshot_path.parent.mkdir()
+    snapshot_path.write_bytes(SNAPSHOT_MAGIC + (999).to_bytes(2, "big") + b"data")
+    assert SnapshotManager(snapshot_path, make_sources()).load() == {}
+
+
+def test_snapshot_writable_by_others_is_ignored(snapshot_path):
+    sources = make_sources()
+    sources["cache"].set(("images", 550), ["/a.jpg"])
+    SnapshotManager(snapshot_path, sources).save()
+    assert snapshot_path.parent.stat().st_mode & 0o777 == 0o700
+
+    snapshot_path.chmod(0o666)
+    assert SnapshotManager(snapshot_path, make_sources()).load() == {}
+
+    snapshot_path.chmod(0o600)
+    snapshot_path.parent.chmod(0o777)
+    assert SnapshotManager(snapshot_path, make_sources()).load() == {}
+
+
+def test_missing_snapshot(snapshot_path):
+    assert SnapshotManager(snapshot_path, make_sources()).load() == {}
+
+
+def test_stop_survives_unwritable_directory(tmp_path):
+    # A file where the directory should be fails like a read-only filesystem
+    (tmp_path / "read-only").write_text("")
+    path = tmp_path / "read-only" / "snapshot.bin"
+    SnapshotManager(path, make_sources(), interval=0).stop()
+    assert not path.exists()
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+
+import pytest
+
+from api.utils.store import CachedTinyRedis, LocalRedis, get_redis
+
+
+@dataclass
+class Item:
+    id: str = None
+    title: str = ""
+    priority: int = 0
+
+
+@pytest.fixture
+def redis():
+    return LocalRedis()
+
+
+@pytest.fixture
+def items(redis):
+    return CachedTinyRedis(redis, Item, sort_key=lambda o: o.priority)
+
+
+def test_insert_all_is_one_round_trip(redis, items):
+    items.insert_all([Item(str(i), priority=i) for i in range(50)])
+    assert redis.round_trips == 1
+    assert items.version() == 1
+
+
+def test_cached_read_is_one_round_trip(redis, items):
+    items.insert_all([Item(str(i), priority=-i) for i in range(50)])
+    first = items()
+    assert [o.id for o in first] == [str(i) for i in reversed(range(50))]
+
+    redis.round_trips = 0
+    assert items() == first
+    assert redis.round_trips == 1
+
+
+def test_own_writes_update_cache(redis, items):
+    items.insert_all([Item("a", priority=1), Item("b", priority=2)])
+    items()
+    items.insert_all([Item("a", priority=3)])
+    items.delete("b")
+
+    redis.round_trips = 0
+    assert [(o.id, o.priority) for o in items()] == [("a", 3)]
+    assert redis.round_trips == 1
+
+
+def test_other_writer_invalidates_cache(redis, items):
+    other = CachedTinyRedis(redis, Item)
+    items.insert_all([Item("a", "old")])
+    assert items()[0].title == "old"
+
+    other.update(Item("a", "new"))
+    assert items()[0].title == "new"
+
+
+def test_returned_items_are_copies(items):
+    items.insert(Item("a", priority=1))
+    items()[0].priority = 99
+    assert items()[0].priority == 1
+
+
+def test_invalid_redis_url_falls_back_to_local(monkeypatch):
+    monkeypatch.setenv("VERCEL_KV_REDIS_URL", "DUMMY")
+    assert isinstance(get_redis(), LocalRedis)